@@ -17,11 +17,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from .drawer import draw_context, draw
-from .parser import parse, empty_page
+from .drawer import draw_context, draw, draw_page, draw_pdf, draw_pages, \
+    draw_parallel, draw_overlay, draw_raster
+from .parser import parse, parse_table, parse_index, parse_strokes, \
+    parse_async, parse_table_async, empty_page
+from .spatial import spatial_index
 
 __version__ = '0.5.2'
 
-__all__ = ['draw_context', 'draw', 'parse', 'empty_page', '__version__']
+__all__ = [
+    'draw_context', 'draw', 'draw_page', 'draw_pdf', 'draw_pages',
+    'draw_parallel', 'draw_overlay', 'draw_raster',
+    'parse', 'parse_table', 'parse_index', 'parse_strokes', 'parse_async',
+    'parse_table_async', 'empty_page',
+    'spatial_index',
+    '__version__',
+]
 
 # vim: sw=4:et:ai
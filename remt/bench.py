@@ -0,0 +1,240 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmarks of `remt` project parser and renderer.
+
+Synthetic reMarkable lines files are generated with configurable number
+of pages, strokes, segments and mix of pens. Each benchmark is run in a
+separate process to measure its peak memory usage.
+"""
+
+import json
+import mmap
+import multiprocessing
+import numpy as np
+import os.path
+import resource
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from . import const
+from .data import DTYPE_SEGMENT
+from .parser import HEADER_START, FMT_PAGE, FMT_LAYER, FMT_STROKE, \
+    parse_table
+
+# pages: number of pages
+# strokes: number of strokes per page
+# segments: number of segments per stroke
+# pens: pen mix, dictionary of pen and its weight
+# seed: random number generator seed
+SynthConfig = namedtuple(
+    'SynthConfig',
+    ['pages', 'strokes', 'segments', 'pens', 'seed'],
+    defaults=[1, 100, 100, {2: 1, 4: 1, 5: 1, 7: 1}, 0],
+)
+
+# widths of a stroke used by reMarkable tablet
+WIDTHS = (1.875, 2.0, 2.125)
+
+def synth_stroke(rng, n):
+    """
+    Generate segments of a synthetic stroke.
+
+    The stroke is a random walk over a page.
+
+    :param rng: Random number generator.
+    :param n: Number of segments.
+    """
+    segments = np.empty(n, dtype=DTYPE_SEGMENT)
+    start = rng.uniform((0, 0), (const.PAGE_WIDTH, const.PAGE_HEIGHT))
+    steps = rng.normal(0, 4, size=(n, 2))
+    points = start + np.cumsum(steps, axis=0)
+    np.clip(points, 0, (const.PAGE_WIDTH, const.PAGE_HEIGHT), out=points)
+
+    segments['x'] = points[:, 0]
+    segments['y'] = points[:, 1]
+    segments['speed'] = rng.uniform(0, 10, n)
+    segments['direction'] = rng.uniform(0, 2 * np.pi, n)
+    segments['width'] = rng.uniform(1, 4, n)
+    segments['pressure'] = rng.uniform(0, 1, n)
+    return segments
+
+def synth_page(config, rng):
+    """
+    Generate reMarkable lines data of a synthetic page.
+
+    The page has single layer.
+
+    :param config: Synthetic data configuration.
+    :param rng: Random number generator.
+    """
+    pens = list(config.pens)
+    weights = np.array([config.pens[p] for p in pens], dtype=float)
+    pens = rng.choice(pens, size=config.strokes, p=weights / weights.sum())
+
+    data = [HEADER_START, FMT_PAGE.pack(1, 0, 0), FMT_LAYER.pack(config.strokes)]
+    for pen in pens.tolist():
+        color = int(rng.integers(0, 3))
+        width = WIDTHS[rng.integers(0, len(WIDTHS))]
+        n = config.segments
+        data.append(FMT_STROKE.pack(pen, color, 0, width, n))
+        data.append(synth_stroke(rng, n).tobytes())
+    return b''.join(data)
+
+def synth_document(config, path):
+    """
+    Generate reMarkable lines files of a synthetic document.
+
+    Return list of reMarkable lines files.
+
+    :param config: Synthetic data configuration.
+    :param path: Directory, where the files are created.
+    """
+    rng = np.random.default_rng(config.seed)
+    files = []
+    for i in range(config.pages):
+        fn = os.path.join(path, '{}.rm'.format(i))
+        with open(fn, 'wb') as f:
+            f.write(synth_page(config, rng))
+        files.append(fn)
+    return files
+
+def bench_parse(files):
+    """
+    Measure parsing throughput of reMarkable lines files.
+
+    :param files: Collection of reMarkable lines files.
+    """
+    n = 0
+    start = time.perf_counter()
+    for i, fn in enumerate(files):
+        with open(fn, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            page = parse_table(data, i)
+        n += len(page.segments)
+    duration = time.perf_counter() - start
+
+    return {
+        'time': duration,
+        'segments': n,
+        'segments_per_s': n / duration,
+    }
+
+def bench_render(files, fn_out, backend='cairo'):
+    """
+    Measure rendering time of reMarkable lines files and size of output
+    PDF file.
+
+    :param files: Collection of reMarkable lines files.
+    :param fn_out: Output PDF file.
+    :param backend: Drawing backend.
+    """
+    from .drawer import draw_pdf
+
+    pages = [parse_table(read_file(fn), i) for i, fn in enumerate(files)]
+    start = time.perf_counter()
+    draw_pdf(pages, None, fn_out, backend=backend)
+    duration = time.perf_counter() - start
+
+    return {
+        'time': duration,
+        'time_per_page': duration / len(pages),
+        'pdf_size': os.path.getsize(fn_out),
+    }
+
+def read_file(fn):
+    with open(fn, 'rb') as f:
+        return f.read()
+
+def run_isolated(bench, *args):
+    """
+    Run benchmark in a separate process and add its peak memory usage to
+    the benchmark results.
+
+    The process is spawned, not forked, so its peak memory usage does not
+    include memory of the parent process.
+
+    :param bench: Benchmark function.
+    :param args: Benchmark function arguments.
+    """
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=mp_context) as executor:
+        return executor.submit(measure_rss, bench, *args).result()
+
+def measure_rss(bench, *args):
+    result = bench(*args)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss'] = rss * 1024  # KiB on Linux
+    return result
+
+def run(config, path):
+    """
+    Generate synthetic document and run all benchmarks.
+
+    :param config: Synthetic data configuration.
+    :param path: Directory for synthetic data and output files.
+    """
+    files = synth_document(config, path)
+    fn_out = os.path.join(path, 'output.pdf')
+    fn_out_pdf = os.path.join(path, 'output-pdf.pdf')
+    return {
+        'config': config._asdict(),
+        'parse': run_isolated(bench_parse, files),
+        'render': run_isolated(bench_render, files, fn_out),
+        'render_pdf': run_isolated(bench_render, files, fn_out_pdf, 'pdf'),
+    }
+
+def save(results, fn):
+    """
+    Save benchmark results as baseline in JSON file.
+
+    :param results: Benchmark results.
+    :param fn: Baseline file name.
+    """
+    with open(fn, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load(fn):
+    """
+    Load baseline of benchmark results from JSON file.
+
+    :param fn: Baseline file name.
+    """
+    with open(fn) as f:
+        return json.load(f)
+
+def compare(results, baseline=None):
+    """
+    Format benchmark results and compare them with a baseline.
+
+    :param results: Benchmark results.
+    :param baseline: Optional baseline of benchmark results.
+    """
+    for bench in ('parse', 'render', 'render_pdf'):
+        for key, value in sorted(results.get(bench, {}).items()):
+            line = '{}.{}: {:.6g}'.format(bench, key, value)
+            if baseline:
+                base = baseline.get(bench, {}).get(key)
+                if base:
+                    line += ' ({:+.1f}%)'.format((value / base - 1) * 100)
+            yield line
+
+# vim: sw=4:et:ai
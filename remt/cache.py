@@ -0,0 +1,339 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Cache of parsed pages of reMarkable lines files.
+
+A page table is stored in a file named after document UUID and page id
+of the parsed reMarkable lines file. A page table parsed with a stroke
+filter is stored in a separate file, named after the stroke filter as
+well. The file contains digest of the reMarkable lines data, so a page
+table of a modified page is parsed again.
+
+The least recently used files are removed when size of the cache
+exceeds its limit.
+
+Rendered pages of a document are stored in a directory named after
+document UUID, a PDF file for each page. A manifest file of the directory
+contains fingerprints of the pages, so a page is rendered again only when
+its fingerprint changes. The least recently used directories are removed
+when size of the rendered pages exceeds its limit.
+
+Metadata files of a reMarkable tablet are stored in a directory with
+a manifest file containing size and modification time of each file, so
+only changed files are fetched from the tablet. The directory is locked
+while the files are synchronized and read.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import os.path
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from aiocontext import async_contextmanager
+
+from .data import PageTable
+
+logger = logging.getLogger(__name__)
+
+# prefix of temporary files of the page cache
+TMP_PREFIX = '.tmp-'
+
+# age in seconds of a temporary file left by a terminated process
+TMP_AGE = 3600
+
+# path: cache directory
+# size: maximum size of the cache in bytes
+PageCache = namedtuple('PageCache', ['path', 'size'])
+
+def page_digest(data):
+    """
+    Calculate digest of reMarkable lines data.
+
+    :param data: Buffer with reMarkable lines data.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def select_key(select):
+    """
+    Calculate key of a stroke filter used in cache file names.
+
+    :param select: Stroke filter.
+    """
+    pens, layers, bbox = select
+    pens = None if pens is None else sorted(pens)
+    layers = None if layers is None else sorted(layers)
+    data = repr((pens, layers, bool(bbox))).encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def cache_file(cache, fin, select=None):
+    """
+    Get cache file name for a reMarkable lines file.
+
+    :param cache: Page cache.
+    :param fin: reMarkable lines file.
+    :param select: Optional stroke filter.
+    """
+    uuid = os.path.basename(os.path.dirname(fin))
+    page = os.path.splitext(os.path.basename(fin))[0]
+    if select:
+        page = '{}.{}'.format(page, select_key(select))
+    return os.path.join(cache.path, '{}.{}.npz'.format(uuid, page))
+
+def load_page(cache, fin, digest, select=None):
+    """
+    Load page table of reMarkable lines file from the cache.
+
+    Return null if there is no page table in the cache or if digest of
+    the reMarkable lines data does not match.
+
+    :param cache: Page cache.
+    :param fin: reMarkable lines file.
+    :param digest: Digest of reMarkable lines data.
+    :param select: Optional stroke filter used to parse the page table.
+    """
+    fn = cache_file(cache, fin, select)
+    try:
+        with np.load(fn) as data:
+            if str(data['digest']) != digest:
+                return None
+            page = PageTable(
+                0, int(data['layers']), data['strokes'], data['segments']
+            )
+        # mark as recently used
+        os.utime(fn)
+    except FileNotFoundError:
+        page = None
+    except Exception as ex:
+        logger.warning('Cannot load page from cache {}: {}'.format(fn, ex))
+        page = None
+    return page
+
+def store_page(cache, fin, digest, page, select=None):
+    """
+    Store page table of reMarkable lines file in the cache.
+
+    :param cache: Page cache.
+    :param fin: reMarkable lines file.
+    :param digest: Digest of reMarkable lines data.
+    :param page: Page table.
+    :param select: Optional stroke filter used to parse the page table.
+    """
+    os.makedirs(cache.path, exist_ok=True)
+    fn = cache_file(cache, fin, select)
+
+    # write to temporary file and rename it, so concurrent readers never
+    # see partial data
+    f = tempfile.NamedTemporaryFile(
+        dir=cache.path, prefix=TMP_PREFIX, delete=False
+    )
+    try:
+        with f:
+            np.savez(
+                f,
+                digest=np.array(digest),
+                layers=np.array(page.layers),
+                strokes=page.strokes,
+                segments=page.segments,
+            )
+        os.replace(f.name, fn)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+def evict(cache):
+    """
+    Remove least recently used files from the cache until size of the
+    cache is within its limit.
+
+    Temporary files being written by other processes are skipped.
+
+    :param cache: Page cache.
+    """
+    if not os.path.exists(cache.path):
+        return
+
+    items = []
+    now = time.time()
+    for entry in os.scandir(cache.path):
+        try:
+            st = entry.stat()
+        except FileNotFoundError:  # removed by another process
+            continue
+        if entry.name.startswith(TMP_PREFIX):
+            if now - st.st_mtime > TMP_AGE:
+                _remove(entry.path)
+            continue
+        items.append((st.st_mtime, st.st_size, entry.path))
+
+    items.sort(reverse=True)
+    total = 0
+    for _, size, fn in items:
+        total += size
+        if total > cache.size:
+            _remove(fn)
+
+def evict_dirs(cache):
+    """
+    Remove least recently used directories from the cache until size of
+    the cache is within its limit.
+
+    The cache shall be locked by the current process.
+
+    :param cache: Cache of directories, i.e. of rendered pages of
+        documents.
+    """
+    if not os.path.exists(cache.path):
+        return
+
+    items = []
+    for entry in os.scandir(cache.path):
+        if not entry.is_dir():
+            continue
+        size = sum(
+            v.stat().st_size for v in os.scandir(entry.path) if v.is_file()
+        )
+        items.append((entry.stat().st_mtime, size, entry.path))
+
+    items.sort(reverse=True)
+    total = 0
+    for _, size, path in items:
+        total += size
+        if total > cache.size:
+            shutil.rmtree(path, ignore_errors=True)
+
+def _remove(fn):
+    try:
+        os.remove(fn)
+    except FileNotFoundError:  # removed by another process
+        pass
+
+def load_manifest(path):
+    """
+    Load manifest of files stored in a directory.
+
+    Return empty manifest if there is no manifest file or it cannot be
+    read.
+
+    :param path: Directory of the files, i.e. rendered pages.
+    """
+    fn = os.path.join(path, 'manifest.json')
+    try:
+        with open(fn) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as ex:
+        logger.warning('Cannot load manifest {}: {}'.format(fn, ex))
+        return {}
+
+def store_manifest(path, manifest):
+    """
+    Store manifest of files in a directory.
+
+    :param path: Directory of the files, i.e. rendered pages.
+    :param manifest: Dictionary of file id, i.e. page id, and file
+        fingerprint.
+    """
+    os.makedirs(path, exist_ok=True)
+    fn = os.path.join(path, 'manifest.json')
+    with tempfile.NamedTemporaryFile('w', dir=path, delete=False) as f:
+        json.dump(manifest, f)
+    os.replace(f.name, fn)
+
+def dirty_pages(path, manifest, fingerprints):
+    """
+    Get ids of pages, which need to be rendered again.
+
+    A page is dirty if its fingerprint is different than the one stored in
+    the manifest or if its PDF file does not exist.
+
+    :param path: Directory of rendered pages.
+    :param manifest: Dictionary of page id and page fingerprint stored
+        with rendered pages.
+    :param fingerprints: Dictionary of page id and current page
+        fingerprint.
+    """
+    exists = lambda p: os.path.exists(render_file(path, p))
+    return [
+        p for p, v in fingerprints.items()
+        if manifest.get(p) != v or not exists(p)
+    ]
+
+def render_file(path, page):
+    """
+    Get PDF file name of a rendered page.
+
+    :param path: Directory of rendered pages.
+    :param page: Page id.
+    """
+    return os.path.join(path, page + '.pdf')
+
+def remove_pages(path, pages):
+    """
+    Remove PDF files of rendered pages, which are not in the collection of
+    pages.
+
+    :param path: Directory of rendered pages.
+    :param pages: Collection of page ids to keep.
+    """
+    files = {render_file(path, p) for p in pages}
+    for entry in os.scandir(path):
+        if entry.name.endswith('.pdf') and entry.path not in files:
+            os.remove(entry.path)
+
+@async_contextmanager
+async def cache_lock(path, delay=0.1):
+    """
+    Lock cache directory for exclusive use by current process.
+
+    The directory is created if it does not exist. If the directory is
+    locked by another process, then a warning is logged and the lock is
+    retried without blocking event loop.
+
+    The function is an asynchronous context manager and the lock is
+    released on exit.
+
+    :param path: Cache directory.
+    :param delay: Delay between attempts to lock the directory in seconds.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'w') as f:
+        waiting = False
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if not waiting:
+                    logger.warning(
+                        'Waiting for lock of cache directory {}'.format(path)
+                    )
+                    waiting = True
+                await asyncio.sleep(delay)
+        yield
+
+# vim: sw=4:et:ai
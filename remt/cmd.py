@@ -21,28 +21,42 @@
 Command line commands.
 """
 
+import asyncio
 import asyncssh
 import configparser
 import glob
 import json
+import logging
+import mmap
 import operator
 import os.path
 import shutil
 import urllib.request
 from aiocontext import async_contextmanager
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from cytoolz.dicttoolz import assoc, get_in
-from cytoolz.functoolz import flip, curry, compose
+from cytoolz.functoolz import compose
 from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
 from tempfile import TemporaryDirectory
 from uuid import uuid4 as uuid
 
 import remt
-from .data import Page, Stroke
+from .cache import PageCache, page_digest, load_page, store_page, evict, \
+    evict_dirs, cache_lock, load_manifest, store_manifest, dirty_pages, \
+    render_file, remove_pages
+from .data import StrokeFilter
 from .error import *
-from .util import split, flatten
-from .pdf import pdf_open, pdf_text
+from .parser import page_items, empty_table
+from .util import flatten
+from .pdf import pdf_open, pdf_page_count, pdf_texts, pdf_merge
+from .search import search_open, stale_documents, store_document, \
+    remove_documents, search
+from .spatial import spatial_index
 
+logger = logging.getLogger(__name__)
 
 BASE_DIR = '/home/root/.local/share/remarkable/xochitl'
 
@@ -90,12 +104,64 @@ def read_config():
     cp.read(conf_file)
     return cp
 
+def cache_path(config, name):
+    """
+    Get path of a `remt` project cache directory.
+
+    :param config: `remt` project configuration.
+    :param name: Name of the cache directory.
+    """
+    path = config.get('cache', 'path', fallback='~/.cache/remt')
+    return os.path.join(os.path.expanduser(path), name)
+
+def cache_enabled(config):
+    """
+    Check if `remt` project cache is enabled.
+
+    :param config: `remt` project configuration.
+    """
+    return config.getboolean('cache', 'enabled', fallback=True)
+
+def page_cache(config):
+    """
+    Create page cache using `remt` project configuration.
+
+    Return null if the cache is disabled.
+
+    :param config: `remt` project configuration.
+    """
+    if not cache_enabled(config):
+        return None
+
+    size = config.getint('cache', 'size', fallback=512)
+    return PageCache(cache_path(config, 'pages'), size * 1024 ** 2)
+
+def render_cache(config):
+    """
+    Create cache of rendered pages using `remt` project configuration.
+
+    Return null if the cache is disabled.
+
+    :param config: `remt` project configuration.
+    """
+    if not cache_enabled(config):
+        return None
+
+    size = config.getint('cache', 'render_size', fallback=512)
+    return PageCache(cache_path(config, 'render'), size * 1024 ** 2)
+
 @async_contextmanager
-async def remt_ctx():
+async def remt_ctx(refresh=False):
     """
     Create a `remt` project context.
 
+    Metadata files of a reMarkable tablet are kept in the cache directory,
+    unless the cache is disabled.
+
     The function is an asynchronous context manager.
+
+    :param refresh: Fetch all metadata files from a reMarkable tablet if
+        true.
     """
     config = read_config()
 
@@ -109,10 +175,12 @@ async def remt_ctx():
                 with TemporaryDirectory() as dir_base:
                     dir_meta = os.path.join(dir_base, 'metadata')
                     dir_data = os.path.join(dir_base, 'data')
-                    os.mkdir(dir_meta)
                     os.mkdir(dir_data)
+                    if cache_enabled(config):
+                        dir_meta = cache_path(config, 'metadata')
 
-                    meta = await read_meta(sftp, dir_meta)
+                    async with cache_lock(dir_meta):
+                        meta = await read_meta(sftp, dir_meta, refresh)
                     yield RemtContext(config, sftp, dir_meta, meta, dir_data)
     except OSError as ex:
         if ex.errno == 101:
@@ -159,16 +227,73 @@ def fn_metadata(meta, path):
 # parsing pages from a collection of files in reMarkable lines format
 #
 
-def parse_document(ctx, data):
-    get_fin = lambda p: os.path.join(ctx.dir_data, data['uuid'], p) + '.rm'
+def parse_document(ctx, data, select=None, jobs=1, cache=None):
+    """
+    Parse pages of a document from reMarkable lines files.
+
+    The pages are parsed by a pool of processes if number of jobs is
+    greater than one. The pages are returned in page order.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of the document.
+    :param select: Optional stroke filter.
+    :param jobs: Number of processes parsing the pages, use 0 for number
+        of CPUs.
+    :param cache: Optional page cache.
+    """
+    tables = read_document(ctx, data, select, jobs, cache)
+    yield from flatten(page_items(t) for t in tables)
+
+def read_document(ctx, data, select=None, jobs=1, cache=None):
+    """
+    Read page tables of a document from reMarkable lines files.
+
+    The pages are parsed by a pool of processes if number of jobs is
+    greater than one. The pages are returned in page order.
+
+    Least recently used files are removed from the page cache, when all
+    pages are read.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of the document.
+    :param select: Optional stroke filter.
+    :param jobs: Number of processes parsing the pages, use 0 for number
+        of CPUs.
+    :param cache: Optional page cache.
+    """
+    files = page_files(ctx, data)
+    args = (files, range(len(files)), repeat(select), repeat(cache))
+    if jobs == 1:
+        yield from map(read_page, *args)
+    else:
+        with ProcessPoolExecutor(jobs or None) as executor:
+            yield from executor.map(read_page, *args)
+
+    if cache is not None:
+        evict(cache)
+
+def page_ids(data):
+    """
+    Get ids of pages of a document.
+
+    :param data: Metadata of the document.
+    """
     pages = data['content'].get('pages')
     if pages is None:
         pages = [str(i) for i in range(data['content']['pageCount'])]
-    items = flatten(parse_page(get_fin(p), i) for i, p in enumerate(pages))
-    yield from items
+    return pages
 
+def page_files(ctx, data):
+    """
+    Get reMarkable lines files of pages of a document.
 
-def parse_page(fin, page_number):
+    :param ctx: `remt` project context.
+    :param data: Metadata of the document.
+    """
+    get_fin = lambda p: os.path.join(ctx.dir_data, data['uuid'], p) + '.rm'
+    return [get_fin(p) for p in page_ids(data)]
+
+def parse_page(fin, page_number, select=None):
     """
     Parse page from reMarkable lines file.
 
@@ -180,12 +305,85 @@ def parse_page(fin, page_number):
 
     :param fin: reMarkable lines file.
     :param page_number: Page number to be associated with the page.
+    :param select: Optional stroke filter.
     """
-    if os.path.exists(fin):
-        with open(fin, 'rb') as f:
-            items = yield from remt.parse(f, page_number)
-    else:
-        yield from remt.empty_page(page_number)
+    yield from page_items(read_page(fin, page_number, select))
+
+async def read_document_stream(ctx, data, select=None, prefetch=2):
+    """
+    Read page tables of a document from reMarkable lines files read
+    directly from a reMarkable tablet.
+
+    The files are read and parsed by a task, which runs ahead of the
+    consumer of the page tables by up to `prefetch` pages, so next pages
+    are transferred and parsed while a page is processed. Segments of
+    strokes are decoded as their data arrives, without reading a whole
+    file first. The pages are returned in page order.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of the document.
+    :param select: Optional stroke filter.
+    :param prefetch: Number of pages to fetch ahead.
+    """
+    base = fn_path(data, ext='')
+    pages = page_ids(data)
+    queue = asyncio.Queue(prefetch)
+
+    async def fetch():
+        try:
+            for i, p in enumerate(pages):
+                fin = '{}/{}.rm'.format(base, p)
+                try:
+                    async with ctx.sftp.open(fin, 'rb') as f:
+                        page = await remt.parse_table_async(f, i, select)
+                except asyncssh.SFTPNoSuchFile:
+                    page = empty_table(i)
+                await queue.put(page)
+        except Exception as ex:
+            await queue.put(ex)
+
+    task = asyncio.ensure_future(fetch())
+    try:
+        for _ in pages:
+            page = await queue.get()
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        task.cancel()
+
+def read_page(fin, page_number, select=None, cache=None):
+    """
+    Read page table from reMarkable lines file.
+
+    Return empty page table if file does not exist. The file is memory
+    mapped for parsing.
+
+    If page cache is used, then page table is loaded from the cache when
+    reMarkable lines data did not change. Otherwise, the page is parsed
+    with the stroke filter and stored in the cache. Page tables parsed
+    with different stroke filters are cached separately.
+
+    :param fin: reMarkable lines file.
+    :param page_number: Page number to be associated with the page.
+    :param select: Optional stroke filter.
+    :param cache: Optional page cache.
+    """
+    if not os.path.exists(fin):
+        return empty_table(page_number)
+
+    with open(fin, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if cache is None:
+            return remt.parse_table(data, page_number, select)
+
+        digest = page_digest(data)
+        page = load_page(cache, fin, digest, select)
+        if page is None:
+            page = remt.parse_table(data, page_number, select)
+            store_page(cache, fin, digest, page, select)
+
+    return page._replace(number=page_number)
 
 #
 # metadata
@@ -221,12 +419,15 @@ def create_metadata(is_dir, parent_uuid, name):
     }
     return data
 
-async def read_meta(sftp, dir_meta):
+async def read_meta(sftp, dir_meta, refresh=False):
     """
     Read metadata from a reMarkable tablet.
+
+    :param sftp: SFTP connection to a reMarkable tablet.
+    :param dir_meta: Directory of metadata files.
+    :param refresh: Fetch all metadata files if true.
     """
-    await sftp.mget(BASE_DIR + '/*.metadata', dir_meta)
-    await sftp.mget(BASE_DIR + '/*.content', dir_meta)
+    await sync_meta(sftp, dir_meta, refresh)
 
     to_uuid = compose(
         operator.itemgetter(0),
@@ -250,6 +451,56 @@ async def read_meta(sftp, dir_meta):
     meta = {u: assoc(m, 'content', c) for u, m, c in data}
     return resolve_uuid(meta)
 
+async def sync_meta(sftp, dir_meta, refresh=False):
+    """
+    Synchronize metadata files of a reMarkable tablet with a directory.
+
+    Only new metadata files and the files with changed size or
+    modification time are fetched, unless full refresh is requested.
+    Files removed from a reMarkable tablet are removed from the
+    directory. Each fetched file replaces its old version atomically.
+
+    :param sftp: SFTP connection to a reMarkable tablet.
+    :param dir_meta: Directory of metadata files.
+    :param refresh: Fetch all metadata files if true.
+    """
+    is_meta = lambda fn: fn.endswith(('.metadata', '.content'))
+
+    files = await sftp.readdir(BASE_DIR)
+    attrs = {
+        v.filename: [v.attrs.size, v.attrs.mtime]
+        for v in files if is_meta(v.filename)
+    }
+
+    manifest = {} if refresh else load_manifest(dir_meta)
+    exists = lambda fn: os.path.exists(os.path.join(dir_meta, fn))
+    changed = [
+        fn for fn, v in attrs.items()
+        if manifest.get(fn) != v or not exists(fn)
+    ]
+    logger.info(
+        '{} of {} metadata files changed'.format(len(changed), len(attrs))
+    )
+
+    if changed:
+        with TemporaryDirectory(dir=dir_meta) as dir_tmp:
+            await sftp.mget(
+                [BASE_DIR + '/' + fn for fn in changed], dir_tmp
+            )
+            for fn in changed:
+                os.replace(
+                    os.path.join(dir_tmp, fn), os.path.join(dir_meta, fn)
+                )
+
+    removed = (
+        e.path for e in os.scandir(dir_meta)
+        if is_meta(e.name) and e.name not in attrs
+    )
+    for fn in removed:
+        os.remove(fn)
+
+    store_manifest(dir_meta, attrs)
+
 #
 # cmd: ls
 #
@@ -304,7 +555,7 @@ async def cmd_ls(args):
     to_line = ls_line_long if args.long else ls_line
     path = norm_path(args.path) if args.path else None
 
-    async with remt_ctx() as ctx:
+    async with remt_ctx(args.refresh) as ctx:
         meta = ctx.meta
 
         # get starting UUID while we have all metadata
@@ -329,7 +580,7 @@ async def cmd_mkdir(args):
     """
     Create a directory on reMarkable tablet device.
     """
-    async with remt_ctx() as ctx:
+    async with remt_ctx(args.refresh) as ctx:
         meta = ctx.meta
         path = norm_path(args.path)
 
@@ -363,18 +614,182 @@ async def cmd_mkdir(args):
 async def cmd_export(args):
     path = norm_path(args.input)
 
-    async with remt_ctx() as ctx:
+    draw_args = {'tolerance': args.tolerance, 'curve': args.curve}
+
+    async with remt_ctx(args.refresh) as ctx:
         data = fn_metadata(ctx.meta, path)
-        f = _export_remt if args.remt_render else _export_rm
-        await f(ctx, data, args.output)
+        if args.format == 'png':
+            await _export_png(
+                ctx, data, args.output, args.dpi, jobs=args.jobs, **draw_args
+            )
+        elif args.remt_render and args.incremental:
+            await _export_remt_incremental(
+                ctx, data, args.output, jobs=args.jobs, **draw_args
+            )
+        elif args.remt_render and args.stream:
+            await _export_remt_stream(ctx, data, args.output, **draw_args)
+        elif args.remt_render:
+            await _export_remt(
+                ctx, data, args.output, jobs=args.jobs,
+                overlay=args.overlay, **draw_args
+            )
+        else:
+            await _export_rm(ctx, data, args.output)
 
-async def _export_remt(ctx, data, fout):
+async def _export_remt(ctx, data, fout, jobs=1, overlay=False, **draw_args):
     """
     Export notebook or PDF document using `remt` renderer.
 
     :param ctx: `remt` project context.
     :param data: Metadata of input file.
     :param fout: Filename of output file.
+    :param jobs: Number of processes parsing and rendering pages of the
+        document.
+    :param overlay: Put strokes on top of pages of PDF document instead of
+        rendering the pages.
+    :param draw_args: Drawing context parameters.
+    """
+    to_copy = fn_path(data, ext='*')
+    await ctx.sftp.mget(to_copy, ctx.dir_data, recurse=True)
+
+    fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
+    fin_pdf = fin_pdf if os.path.exists(fin_pdf) else None
+
+    cache = page_cache(ctx.config)
+    pages = read_document(ctx, data, jobs=jobs, cache=cache)
+    if overlay and fin_pdf:
+        remt.draw_overlay(pages, fin_pdf, fout, jobs, **draw_args)
+    elif jobs == 1:
+        remt.draw_pdf(pages, fin_pdf, fout, **draw_args)
+    else:
+        remt.draw_parallel(pages, fin_pdf, fout, jobs, **draw_args)
+
+async def _export_remt_incremental(ctx, data, fout, jobs=1, **draw_args):
+    """
+    Export notebook or PDF document using `remt` renderer and render only
+    pages changed since previous export.
+
+    Each page is rendered into its own PDF file, which is kept in the
+    cache directory. Page fingerprint is created from attributes of
+    reMarkable lines file and PDF document read from a reMarkable tablet,
+    and drawing parameters. Only reMarkable lines files of pages with
+    changed fingerprint are downloaded and rendered. All rendered pages
+    are merged into the output file.
+
+    The cache directory of rendered pages is locked during the export.
+    The least recently used documents are removed from the cache when its
+    size exceeds its limit.
+
+    All pages are rendered without storing them, if the cache is
+    disabled.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of input file.
+    :param fout: Filename of output file.
+    :param jobs: Number of processes rendering pages of the document.
+    :param draw_args: Drawing context parameters.
+    """
+    render = render_cache(ctx.config)
+    if render is None:
+        logger.info('cache disabled, rendering all pages')
+        await _export_remt(ctx, data, fout, jobs=jobs, **draw_args)
+        return
+
+    sftp = ctx.sftp
+    path = os.path.join(render.path, data['uuid'])
+    pages = page_ids(data)
+
+    base = fn_path(data, ext='')
+    try:
+        attrs = {v.filename: v.attrs for v in await sftp.readdir(base)}
+    except asyncssh.SFTPNoSuchFile:
+        attrs = {}
+
+    try:
+        pdf_attrs = await sftp.stat(fn_path(data, ext='.pdf'))
+    except asyncssh.SFTPNoSuchFile:
+        pdf_attrs = None
+
+    fingerprints = page_fingerprints(pages, attrs, pdf_attrs, draw_args)
+    async with cache_lock(render.path):
+        manifest = load_manifest(path)
+        dirty = dirty_pages(path, manifest, fingerprints)
+        logger.info('{} of {} pages changed'.format(len(dirty), len(pages)))
+
+        if dirty:
+            dir_doc = os.path.join(ctx.dir_data, data['uuid'])
+            os.makedirs(dir_doc, exist_ok=True)
+            to_copy = ['{}/{}.rm'.format(base, p) for p in dirty]
+            to_copy = [
+                fn for fn in to_copy if os.path.basename(fn) in attrs
+            ]
+            if to_copy:
+                await sftp.mget(to_copy, dir_doc)
+
+            fin_pdf = None
+            if pdf_attrs:
+                await sftp.get(fn_path(data, ext='.pdf'), ctx.dir_data)
+                fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
+
+            cache = page_cache(ctx.config)
+            numbers = {p: i for i, p in enumerate(pages)}
+            tables = (
+                read_page(
+                    os.path.join(dir_doc, p + '.rm'), numbers[p], cache=cache
+                )
+                for p in dirty
+            )
+            os.makedirs(path, exist_ok=True)
+            files = [render_file(path, p) for p in dirty]
+            remt.draw_pages(tables, fin_pdf, files, jobs, **draw_args)
+            if cache is not None:
+                evict(cache)
+
+        pdf_merge([render_file(path, p) for p in pages], fout)
+        store_manifest(path, fingerprints)
+        remove_pages(path, pages)
+
+        # mark the document as recently used
+        os.utime(path)
+        evict_dirs(render)
+
+def page_fingerprints(pages, attrs, pdf_attrs, draw_args):
+    """
+    Create fingerprints of pages of a document.
+
+    Fingerprint of a page is list of
+
+    - page number
+    - size and modification time of reMarkable lines file
+    - size and modification time of PDF document
+    - drawing parameters
+
+    :param pages: Page ids of the document.
+    :param attrs: Dictionary of file name and SFTP attributes of
+        reMarkable lines files of the document.
+    :param pdf_attrs: SFTP attributes of PDF document or null.
+    :param draw_args: Drawing context parameters.
+    """
+    file_attrs = lambda a: [a.size, a.mtime] if a else [None, None]
+    pdf = file_attrs(pdf_attrs)
+    params = [draw_args[k] for k in sorted(draw_args)]
+    return {
+        p: [i, *file_attrs(attrs.get(p + '.rm')), *pdf, *params]
+        for i, p in enumerate(pages)
+    }
+
+async def _export_png(ctx, data, fout, dpi, jobs=1, **draw_args):
+    """
+    Export notebook or PDF document as PNG files using `remt` renderer.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of input file.
+    :param fout: Filename of output file, page number is added to the
+        filename of each page.
+    :param dpi: Resolution of PNG files.
+    :param jobs: Number of processes parsing pages and threads rendering
+        pages of the document.
+    :param draw_args: Drawing context parameters.
     """
     to_copy = fn_path(data, ext='*')
     await ctx.sftp.mget(to_copy, ctx.dir_data, recurse=True)
@@ -382,10 +797,38 @@ async def _export_remt(ctx, data, fout):
     fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
     fin_pdf = fin_pdf if os.path.exists(fin_pdf) else None
 
-    items = parse_document(ctx, data)
-    with remt.draw_context(fin_pdf, fout) as ctx:
-        for item in items:
-            remt.draw(item, ctx)
+    cache = page_cache(ctx.config)
+    pages = read_document(ctx, data, jobs=jobs, cache=cache)
+    remt.draw_raster(pages, fin_pdf, fout, dpi, jobs, **draw_args)
+
+async def _export_remt_stream(ctx, data, fout, **draw_args):
+    """
+    Export notebook or PDF document using `remt` renderer while reading
+    reMarkable lines files from a reMarkable tablet.
+
+    Only PDF document is downloaded before rendering. Pages are parsed
+    while their reMarkable lines files are read. A page is rendered by
+    a thread, with strokes hidden by eraser strokes removed, while next
+    pages are read.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of input file.
+    :param fout: Filename of output file.
+    :param draw_args: Drawing context parameters.
+    """
+    fin_pdf = None
+    if await ctx.sftp.exists(fn_path(data, ext='.pdf')):
+        await ctx.sftp.get(fn_path(data, ext='.pdf'), ctx.dir_data)
+        fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
+
+    loop = asyncio.get_event_loop()
+    pages = read_document_stream(ctx, data)
+    with remt.draw_context(fin_pdf, fout, **draw_args) as draw_ctx, \
+            ThreadPoolExecutor(1) as executor:
+        async for page in pages:
+            await loop.run_in_executor(
+                executor, remt.draw_page, page, draw_ctx
+            )
 
 async def _export_rm(ctx, data, fout):
     """
@@ -408,28 +851,30 @@ async def _export_rm(ctx, data, fout):
 #
 # cmd: import
 #
-def _prepare_import_data(ctx, fn_in, out_uuid):
+def _prepare_import_data(ctx, out_uuid, fn_in, page_count):
     """
     Prepare import data for a file to be uploaded onto a reMarkable
     tablet.
 
+    The file is linked into the import directory instead of being copied.
+
     :param ctx: `remt` project context.
-    :param fn_in: File to be imported.
     :param out_uuid: UUID of the output directory located on a reMarkable
         tablet.
+    :param fn_in: File to be imported.
+    :param page_count: Number of pages of the file.
     """
     name = os.path.basename(fn_in)
     fn_base = os.path.join(ctx.dir_data, str(uuid()))
     data = create_metadata(False, out_uuid, name)
 
     fn_pdf = fn_base + '.pdf'
-    shutil.copy(fn_in, fn_pdf)
+    os.symlink(os.path.abspath(fn_in), fn_pdf)
     with open(fn_base + '.metadata', 'w') as f:
         json.dump(data, f)
 
     # empty content file required
     with open(fn_base + '.content', 'w') as f:
-        page_count = pdf_open(fn_pdf).get_n_pages()
         content = {
             'fileType': 'pdf',
             'lastOpenedPage': 0,
@@ -440,71 +885,218 @@ def _prepare_import_data(ctx, fn_in, out_uuid):
         json.dump(content, f)
     return fn_base + '.*'
 
+def import_page_counts(files, jobs=1):
+    """
+    Get number of pages of each file to be imported.
+
+    The pages are counted by a pool of processes if number of jobs is
+    greater than one. Number of the processes is limited by number of
+    the files.
+
+    `OSError` is raised if a file cannot be read.
+
+    :param files: Files to be imported.
+    :param jobs: Number of processes counting the pages, use 0 for number
+        of CPUs.
+    """
+    workers = min(jobs or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        return [pdf_page_count(fn) for fn in files]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(pdf_page_count, files))
+
 async def cmd_import(args):
     """
     Import a number of files onto a directory on a reMarkable tablet.
     """
     output = norm_path(args.output)
 
-    async with remt_ctx() as ctx:
+    async with remt_ctx(args.refresh) as ctx:
         out_meta = fn_metadata(ctx.meta, output)
         if out_meta['type'] != 'CollectionType':
             raise FileError('Destination path is not a directory')
 
-        out_uuid = out_meta['uuid']
+        counts = import_page_counts(args.input, args.jobs)
         to_import = [
-            _prepare_import_data(ctx, fn, out_uuid) for fn in args.input
+            _prepare_import_data(ctx, out_meta['uuid'], fn, n)
+            for fn, n in zip(args.input, counts)
         ]
-        await ctx.sftp.mput(to_import, BASE_DIR)
+        await ctx.sftp.mput(to_import, BASE_DIR, follow_symlinks=True)
 
 #
 # cmd: index
 #
 
 async def cmd_index(args):
-    to_text = curry(pdf_text)
-    is_item = flip(isinstance, (Page, Stroke))
-    is_page = flip(isinstance, Page)
-
-    fmt_header = lambda p: \
-        '#. Page {} ({})\n'.format(p.get_label(), p.get_index())
+    fmt_header = '#. Page {} ({})\n'.format
     fmt_text = '   * ``{}``'.format
 
     path = norm_path(args.input)
 
-    async with remt_ctx() as ctx:
+    async with remt_ctx(args.refresh) as ctx:
         data = fn_metadata(ctx.meta, path)
 
         to_copy = fn_path(data, ext='*')
         await ctx.sftp.mget(to_copy, ctx.dir_data, recurse=True)
 
         fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
-        pdf_doc = pdf_open(fin_pdf)
-        get_page = pdf_doc.get_page
-
-        items = parse_document(ctx, data)
-        # find pages and strokes
-        items = (v for v in items if is_item(v))
-        # split into (page, strokes)
-        items = split(is_page, items)
-        # get PDF pages
-        items = ((get_page(p.number), s) for p, s in items)
-        # for each page and stroke get text under stroke
-        items = ((p, map(to_text(p), s)) for p, s in items)
-        # page header and each highlighted text formatted
-        items = ((fmt_header(p), map(fmt_text, t)) for p, t in items)
-        for header, texts in items:
-            print(header)
+        cache = page_cache(ctx.config)
+        items = index_document(ctx, data, fin_pdf, args.jobs, cache)
+        # print only pages with highlighted text
+        items = (v for v in items if v[2])
+        for label, n, texts in items:
+            print(fmt_header(label, n))
             for text in texts:
-                print(text)
+                print(fmt_text(text))
             print()
 
+def index_document(ctx, data, fin_pdf, jobs=1, cache=None):
+    """
+    Get text highlighted on pages of a PDF document.
+
+    Bounding boxes of highlighter strokes are parsed first, and only pages
+    with highlighter strokes are indexed. The pages are parsed and indexed
+    by a pool of processes if number of jobs is greater than one. Each
+    process opens the PDF document. Tuple of PDF page label, PDF page
+    index and list of highlighted texts is returned for each indexed page
+    in page order.
+
+    :param ctx: `remt` project context.
+    :param data: Metadata of the document.
+    :param fin_pdf: PDF file of the document.
+    :param jobs: Number of processes indexing the pages, use 0 for number
+        of CPUs.
+    :param cache: Optional page cache.
+    """
+    # parse bounding boxes of highlighter strokes only
+    select = StrokeFilter(pens={5}, bbox=True)
+    tables = read_document(ctx, data, select, jobs, cache)
+    pages = [p for p in tables if len(p.strokes)]
+
+    args = (repeat(fin_pdf), pages)
+    if jobs == 1:
+        yield from map(index_page, *args)
+    else:
+        # send a few chunks of pages to each process
+        workers = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(pages) // (workers * 4))
+        with ProcessPoolExecutor(workers) as executor:
+            yield from executor.map(index_page, *args, chunksize=chunksize)
+
+def index_page(fin_pdf, page):
+    """
+    Get text highlighted on a page of a PDF document.
+
+    Return tuple of PDF page label, PDF page index and list of highlighted
+    texts.
+
+    :param fin_pdf: PDF file of the document.
+    :param page: Page table with highlighter strokes.
+    """
+    pdf_page = _index_pdf(fin_pdf).get_page(page.number)
+    texts = pdf_texts(pdf_page, spatial_index(page))
+    return pdf_page.get_label(), pdf_page.get_index(), texts
+
+@lru_cache(maxsize=1)
+def _index_pdf(fn):
+    """
+    Open PDF document once for each indexing process.
+    """
+    return pdf_open(fn)
+
+#
+# cmd: search
+#
+
+async def cmd_search(args):
+    fmt = '{}, page {}: {}'.format
+
+    async with remt_ctx(args.refresh) as ctx:
+        db = search_open(cache_path(ctx.config, 'search.db'))
+        try:
+            if not args.no_update:
+                await _search_update(ctx, db, args.jobs)
+
+            for path, label, text in search(db, args.query):
+                print(fmt(path, label, text))
+        finally:
+            db.close()
+
+async def _search_update(ctx, db, jobs=1):
+    """
+    Update search index with highlighted text of PDF documents of
+    a reMarkable tablet.
+
+    Only PDF documents, which metadata modification time or reMarkable
+    lines files changed since previous update, are downloaded and
+    indexed. Files of a document are removed after the document is
+    indexed.
+
+    :param ctx: `remt` project context.
+    :param db: Search index database.
+    :param jobs: Number of processes indexing pages of a document.
+    """
+    sftp = ctx.sftp
+    meta = {
+        data['uuid']: (path, data) for path, data in ctx.meta.items()
+        if not data.get('deleted')
+        and data['content'].get('fileType') == 'pdf'
+    }
+
+    documents = {}
+    for uuid, (path, data) in meta.items():
+        try:
+            attrs = await sftp.readdir(fn_path(data, ext=''))
+        except asyncssh.SFTPNoSuchFile:
+            attrs = []
+        attrs = {v.filename: v.attrs for v in attrs}
+        documents[uuid] = path, document_fingerprint(data, attrs)
+
+    stale, removed = stale_documents(db, documents)
+    logger.info(
+        '{} of {} documents changed'.format(len(stale), len(documents))
+    )
+    remove_documents(db, removed)
+
+    cache = page_cache(ctx.config)
+    for uuid in stale:
+        path, data = meta[uuid]
+        fin_pdf = fn_path(data, base=ctx.dir_data, ext='.pdf')
+        await sftp.mget(fn_path(data, ext='*'), ctx.dir_data, recurse=True)
+        try:
+            items = index_document(ctx, data, fin_pdf, jobs, cache)
+            store_document(db, uuid, path, documents[uuid][1], items)
+        finally:
+            shutil.rmtree(os.path.join(ctx.dir_data, uuid), True)
+            files = glob.glob(fn_path(data, base=ctx.dir_data, ext='.*'))
+            for fn in files:
+                os.remove(fn)
+
+def document_fingerprint(data, attrs):
+    """
+    Create fingerprint of a document.
+
+    Fingerprint of a document is JSON list of metadata modification time
+    of the document, and name, size and modification time of each
+    reMarkable lines file of the document.
+
+    :param data: Metadata of the document.
+    :param attrs: Dictionary of file name and SFTP attributes of files of
+        the document.
+    """
+    files = [
+        [fn, a.size, a.mtime] for fn, a in sorted(attrs.items())
+        if fn.endswith('.rm')
+    ]
+    return json.dumps([data.get('lastModified'), files])
+
 COMMANDS = {
     'ls': cmd_ls,
     'mkdir': cmd_mkdir,
     'export': cmd_export,
     'import': cmd_import,
     'index': cmd_index,
+    'search': cmd_search,
 }
 
 # vim: sw=4:et:ai
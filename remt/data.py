@@ -17,7 +17,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import numpy as np
 from collections import namedtuple
+from collections.abc import Sequence
 
 Page = namedtuple('Page', ['number'])
 PageEnd = namedtuple('PageEnd', ['number'])
@@ -25,18 +27,145 @@ PageEnd = namedtuple('PageEnd', ['number'])
 Layer = namedtuple('Layer', ['number'])
 Stroke = namedtuple(
     'Stroke',
-    ['number', 'pen', 'color', 'width', 'segments']
+    ['number', 'pen', 'color', 'width', 'segments', 'bbox'],
+    defaults=[None],
 )
 Segment = namedtuple(
     'Segment',
     ['number', 'x', 'y', 'speed', 'direction', 'width', 'pressure'],
 )
 
+# bounding box of a stroke
+BBox = namedtuple('BBox', ['x1', 'y1', 'x2', 'y2'])
+
+# filter of strokes of reMarkable lines data
+#
+# pens: set of pens to parse or all if null
+# layers: set of layers to parse or all if null
+# bbox: parse bounding box of strokes only, no segments
+StrokeFilter = namedtuple(
+    'StrokeFilter',
+    ['pens', 'layers', 'bbox'],
+    defaults=[None, None, False],
+)
+
+# page of reMarkable lines data stored as arrays
+#
+# number: page number
+# layers: number of layers
+# strokes: stroke table, see `DTYPE_STROKE`
+# segments: segments of all strokes of the page, see `DTYPE_SEGMENT`
+PageTable = namedtuple('PageTable', ['number', 'layers', 'strokes', 'segments'])
+
+# stroke table row; segments of a stroke are `count` segments at `offset`
+# in segments array of a page; bounding box of a stroke is `x1`, `y1`,
+# `x2` and `y2`
+DTYPE_STROKE = np.dtype([
+    ('layer', '<u4'),
+    ('number', '<u4'),
+    ('pen', '<u4'),
+    ('color', '<u4'),
+    ('width', '<f4'),
+    ('offset', '<u4'),
+    ('count', '<u4'),
+    ('x1', '<f4'),
+    ('y1', '<f4'),
+    ('x2', '<f4'),
+    ('y2', '<f4'),
+])
+
+# spatial index of bounding boxes of strokes of a page
+#
+# bbox: array of bounding boxes of strokes of shape `(n, 4)`
+# cell: size of a grid cell
+# cols: number of columns of the grid
+# start: position of first stroke of each grid cell in `items` array
+# items: indexes of strokes sorted by grid cell
+SpatialIndex = namedtuple(
+    'SpatialIndex', ['bbox', 'cell', 'cols', 'start', 'items']
+)
+
+# index of reMarkable lines page
+#
+# layers: layer index, see `DTYPE_LAYER_INDEX`
+# strokes: stroke index, see `DTYPE_STROKE_INDEX`
+PageIndex = namedtuple('PageIndex', ['layers', 'strokes'])
+
+# layer index row; `offset` is byte offset of a layer in reMarkable lines
+# data and `count` is number of strokes of the layer
+DTYPE_LAYER_INDEX = np.dtype([
+    ('number', '<u4'),
+    ('offset', '<u8'),
+    ('count', '<u4'),
+])
+
+# stroke index row; `offset` is byte offset of a stroke in reMarkable
+# lines data and `count` is number of segments of the stroke
+DTYPE_STROKE_INDEX = np.dtype([
+    ('layer', '<u4'),
+    ('number', '<u4'),
+    ('pen', '<u4'),
+    ('color', '<u4'),
+    ('width', '<f4'),
+    ('offset', '<u8'),
+    ('count', '<u4'),
+])
+
+DTYPE_SEGMENT = np.dtype([
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('speed', '<f4'),
+    ('direction', '<f4'),
+    ('width', '<f4'),
+    ('pressure', '<f4'),
+])
+
+class SegmentView(Sequence):
+    """
+    View of NumPy array of stroke segments as sequence of segment tuples.
+
+    :var array: NumPy structured array of segments.
+    """
+    __slots__ = ('array',)
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SegmentView(self.array[key])
+
+        n = range(len(self.array))[key]
+        return Segment(n, *self.array[n].tolist())
+
+    def __iter__(self):
+        items = enumerate(self.array.tolist())
+        return (Segment(i, *v) for i, v in items)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def __repr__(self):
+        return 'SegmentView({!r})'.format(self.array)
+
 Style = namedtuple(
     'Style',
     ['color', 'join', 'cap', 'brush', 'tool_line']
 )
 Color = namedtuple('Color', ['red', 'green', 'blue', 'alpha'])
-Context = namedtuple('Context', ['cr_surface', 'cr_ctx', 'pdf_doc', 'page_number'])
+# tolerance: tolerance of line simplification or null for no simplification
+# curve: draw lines as cubic Bézier curves if true
+# batch: strokes to be drawn as one path or null to draw strokes one by one
+Context = namedtuple(
+    'Context',
+    [
+        'cr_surface', 'cr_ctx', 'pdf_doc', 'page_number', 'tolerance',
+        'curve', 'batch',
+    ],
+    defaults=[None, False, None],
+)
 
 # vim: sw=4:et:ai
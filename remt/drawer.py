@@ -25,15 +25,26 @@ import cairo
 import io
 import itertools
 import logging
+import math
 import os.path
 import pkgutil
+import shutil
+import tempfile
+import threading
+import time
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import singledispatch, lru_cache, partial
+from itertools import repeat
 
 from . import const, tool
+from .erase import cull_erased
+from .geom import simplify, to_curves
 from .data import *
-from .pdf import pdf_open, pdf_scale
+from .pdf import pdf_open, pdf_scale, pdf_merge, pdf_overlay
+from .pdfwriter import PDFSurface, PDFContext
+from .spatial import spatial_index, intersects
 
 logger = logging.getLogger(__name__)
 
@@ -116,23 +127,100 @@ STYLE = {
 
 path_brush = partial(os.path.join, 'brush')
 
-@lru_cache(maxsize=4)
+# brush patterns of each thread
+_brushes = threading.local()
+
 def load_brush(fn):
-    data = pkgutil.get_data('remt', path_brush(fn))
-    img = cairo.ImageSurface.create_from_png(io.BytesIO(data))
-    brush = cairo.SurfacePattern(img)
-    brush.set_extend(cairo.EXTEND_REPEAT)
+    """
+    Load brush pattern from PNG file.
+
+    Cairo objects are not shared between threads, so each thread rendering
+    pages creates its own brush patterns.
+
+    :param fn: Brush PNG file name.
+    """
+    brushes = getattr(_brushes, 'cache', None)
+    if brushes is None:
+        brushes = _brushes.cache = {}
+
+    brush = brushes.get(fn)
+    if brush is None:
+        img = cairo.ImageSurface.create_from_png(io.BytesIO(brush_data(fn)))
+        brush = brushes[fn] = cairo.SurfacePattern(img)
+        brush.set_extend(cairo.EXTEND_REPEAT)
     return brush
 
+@lru_cache(maxsize=4)
+def brush_data(fn):
+    return pkgutil.get_data('remt', path_brush(fn))
+
 @singledispatch
 def draw(item, context):
     raise NotImplementedError('Unknown item to draw: {}'.format(item))
 
+@draw.register(PageTable)
+def _(page, context):
+    draw_page(page, context)
+
 @draw.register(Page)
 def _(page, context):
+    begin_page(page.number, context)
+
+@draw.register(PageEnd)
+def _(page, context):
+    end_page(context)
+
+@draw.register(Layer)
+def _(layer, context):
+    draw_batch(context)
+
+@draw.register(Stroke)
+def _(stroke, context):
+    draw_stroke(stroke, context)
+
+def draw_page(page, context, area=None):
+    """
+    Draw reMarkable tablet page.
+
+    All strokes of the page are drawn with single call, without creating
+    and dispatching drawing item for each page, layer and stroke. Segments
+    of a stroke are NumPy array.
+
+    Strokes and parts of strokes hidden by eraser strokes are not drawn,
+    see :py:func:`remt.erase.cull_erased`.
+
+    :param page: Page table.
+    :param context: Drawing context.
+    :param area: Draw only strokes intersecting the area, if specified, as
+        tuple of left, top, right and bottom coordinates.
+    """
+    page = cull_erased(page)
+    if area is not None:
+        index = spatial_index(page)
+        page = page._replace(strokes=page.strokes[intersects(index, *area)])
+    begin_page(page.number, context)
+
+    segments = page.segments
+    layer = None
+    for n_layer, n, pen, color, width, offset, count, *_ \
+            in page.strokes.tolist():
+        if n_layer != layer:
+            draw_batch(context)
+            layer = n_layer
+        items = segments[offset:offset + count]
+        draw_stroke(Stroke(n, pen, color, width, items), context)
+
+    end_page(context)
+
+def begin_page(page_number, context):
+    """
+    Start drawing of a page.
+
+    :param page_number: Page number.
+    :param context: Drawing context.
+    """
     surface = context.cr_surface
-    page_number = next(context.page_number)
-    if page_number:
+    if next(context.page_number):
         surface.show_page()
 
     if context.pdf_doc:
@@ -150,22 +238,76 @@ def _(page, context):
         factor = pdf_scale(pdf_page)
         cr.scale(factor, factor)
 
-@draw.register(PageEnd)
-def _(page, context):
+def end_page(context):
+    """
+    Finish drawing of a page.
+
+    :param context: Drawing context.
+    """
+    draw_batch(context)
     if context.pdf_doc:
         context.cr_ctx.restore()
 
-@draw.register(Layer)
-def _(layer, context):
-    pass
+def draw_stroke(stroke, context):
+    """
+    Draw a stroke.
 
-@draw.register(Stroke)
-def _(stroke, context):
+    Strokes of the same style, color and width are collected in the
+    drawing context batch, if the context has one.
+
+    :param stroke: Stroke data.
+    :param context: Drawing context.
+    """
     style = STYLE.get(stroke.pen)
     if not style:
         logger.debug('Not supported pen for stroke: {}'.format(stroke))
         return
 
+    batch = context.batch
+    if batch is None or not is_batched(stroke, style):
+        draw_batch(context)
+        draw_strokes(context, [stroke])
+        return
+
+    # draw strokes of the same style, color and width as one path
+    if batch and stroke_key(batch[-1]) != stroke_key(stroke):
+        draw_batch(context)
+    batch.append(stroke)
+
+def stroke_key(stroke):
+    """
+    Get key identifying style, color and width of a stroke.
+    """
+    return STYLE[stroke.pen], stroke.color, stroke.width
+
+def is_batched(stroke, style):
+    """
+    Check if a stroke can be drawn with other strokes as one path.
+
+    Filled shapes and translucent strokes are drawn separately, so their
+    shape and color is not changed.
+    """
+    return stroke.pen != 8 and (style.color is None or style.color.alpha == 1)
+
+def draw_batch(context):
+    """
+    Draw strokes collected in the drawing context batch.
+    """
+    batch = context.batch
+    if batch:
+        draw_strokes(context, batch)
+        batch.clear()
+
+def draw_strokes(context, strokes):
+    """
+    Draw strokes of the same style, color and width.
+
+    :param context: Drawing context.
+    :param strokes: Collection of strokes.
+    """
+    stroke = strokes[0]
+    style = STYLE[stroke.pen]
+
     # if no predefined style color, then use stroke color
     assert stroke.color in (0, 1, 2)
     color = style.color
@@ -184,33 +326,68 @@ def _(stroke, context):
         brush = load_brush(style.brush)
         cr.set_source(brush)
 
-    lines = style.tool_line(stroke)
-    draw_multi_line(cr, draw_stroke, lines)
+    lines = itertools.chain.from_iterable(style.tool_line(s) for s in strokes)
+    tolerance = context.tolerance
+    if tolerance:
+        lines = ((w, simplify(p, tolerance)) for w, p in lines)
+    draw_multi_line(cr, draw_stroke, lines, context.curve)
 
     cr.restore()
 
-def draw_multi_line(cr, draw_stroke, lines):
+def draw_multi_line(cr, draw_stroke, lines, curve=False):
     """
     Draw multiple lines.
 
     A line is tuple
 
     - width of a line
-    - collection of points
+    - array of points
+
+    Lines of the same width are drawn as one path.
 
     :param cr: Cairo context.
     :param draw_stroke: Drawing stroke function (i.e. line or filled area).
     :param lines: Collection of lines to draw.
+    :param curve: Draw lines as cubic Bézier curves if true.
     """
+    paths = {}
     for width, points in lines:
-        # on new path, the position of point is undefined and first
-        # `line_to` call acts as `move_to`
+        paths.setdefault(width, []).append(points)
+
+    for width, items in paths.items():
         cr.new_path()
         cr.set_line_width(width)
-        for x, y in points:
-            cr.line_to(x, y)
+        for points in items:
+            add_path(cr, points, curve)
         draw_stroke()
 
+@singledispatch
+def add_path(cr, points, curve=False):
+    """
+    Add line or cubic Bézier curves through array of points to current
+    path of a drawing context.
+
+    :param cr: Cairo context.
+    :param points: Array of points of shape `(n, 2)`.
+    :param curve: Add cubic Bézier curves if true.
+    """
+    if not len(points):
+        return
+
+    cr.move_to(*points[0].tolist())
+    if curve and len(points) > 2:
+        curve_to = cr.curve_to
+        for c1, c2, p in to_curves(points).tolist():
+            curve_to(*c1, *c2, *p)
+    else:
+        line_to = cr.line_to
+        for x, y in points[1:].tolist():
+            line_to(x, y)
+
+@add_path.register(PDFContext)
+def _(cr, points, curve=False):
+    cr.add_path(points, curve)
+
 def draw_fill(cr):
     """
     Draw Cairo shape and fill.
@@ -219,14 +396,264 @@ def draw_fill(cr):
     cr.fill()
 
 @contextmanager
-def draw_context(fn_pdf, fn_out):
+def draw_context(fn_pdf, fn_out, tolerance=None, curve=False,
+        backend='cairo'):
+    """
+    Create drawing context for rendering reMarkable tablet pages into
+    PDF file.
+
+    The `pdf` backend writes strokes directly into PDF page content
+    streams. It does not support brushes and annotation of PDF documents.
+
+    :param fn_pdf: PDF file to annotate or null.
+    :param fn_out: Output PDF file.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    :param backend: Drawing backend, `cairo` or `pdf`.
+    """
+    if backend == 'pdf':
+        if fn_pdf:
+            raise ValueError('PDF backend cannot annotate PDF document')
+        create_surface, create_context = PDFSurface, PDFContext
+    elif backend == 'cairo':
+        create_surface, create_context = cairo.PDFSurface, cairo.Context
+    else:
+        raise ValueError('Unknown drawing backend: {}'.format(backend))
+
     pdf_doc = pdf_open(fn_pdf) if fn_pdf else None
-    surface = cairo.PDFSurface(fn_out, const.PAGE_WIDTH, const.PAGE_HEIGHT)
+    surface = create_surface(fn_out, const.PAGE_WIDTH, const.PAGE_HEIGHT)
     try:
-        cr_ctx = cairo.Context(surface)
-        context = Context(surface, cr_ctx, pdf_doc, itertools.count())
+        cr_ctx = create_context(surface)
+        context = Context(
+            surface, cr_ctx, pdf_doc, itertools.count(), tolerance, curve, []
+        )
         yield context
     finally:
         surface.finish()
 
+def draw_pdf(pages, fn_pdf, fn_out, tolerance=None, curve=False,
+        backend='cairo'):
+    """
+    Render reMarkable tablet pages into PDF file.
+
+    :param pages: Collection of page tables.
+    :param fn_pdf: PDF file to annotate or null.
+    :param fn_out: Output PDF file.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    :param backend: Drawing backend, `cairo` or `pdf`.
+    """
+    draw_ctx = draw_context(fn_pdf, fn_out, tolerance, curve, backend)
+    with draw_ctx as context:
+        for page in pages:
+            draw_page(page, context)
+
+def draw_parallel(pages, fn_pdf, fn_out, jobs=0, tolerance=None,
+        curve=False):
+    """
+    Render reMarkable tablet pages into PDF file with a pool of processes.
+
+    Each process renders a slice of consecutive pages, including pages of
+    annotated PDF document, into a partial PDF file. The partial PDF files
+    are merged in page order into the output PDF file.
+
+    :param pages: Collection of page tables.
+    :param fn_pdf: PDF file to annotate or null.
+    :param fn_out: Output PDF file.
+    :param jobs: Number of processes rendering the pages, use 0 for number
+        of CPUs.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    """
+    pages = list(pages)
+    jobs = min(jobs or os.cpu_count(), len(pages))
+    if jobs < 2:
+        draw_pdf(pages, fn_pdf, fn_out, tolerance, curve)
+        return
+
+    slices = split_pages(pages, jobs)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = [
+            os.path.join(tmp_dir, '{:03d}.pdf'.format(i))
+            for i in range(len(slices))
+        ]
+        ts = time.perf_counter()
+        with ProcessPoolExecutor(jobs) as executor:
+            items = executor.map(
+                draw_pdf, slices, repeat(fn_pdf), files, repeat(tolerance),
+                repeat(curve),
+            )
+            # wait for all processes and propagate errors
+            list(items)
+        logger.info('rendered {} pages with {} processes in {:.2f}s'.format(
+            len(pages), jobs, time.perf_counter() - ts
+        ))
+
+        ts = time.perf_counter()
+        pdf_merge(files, fn_out)
+        logger.info('merged {} partial PDF files in {:.2f}s'.format(
+            len(files), time.perf_counter() - ts
+        ))
+
+def draw_overlay(pages, fn_pdf, fn_out, jobs=1, tolerance=None,
+        curve=False):
+    """
+    Render reMarkable tablet pages on top of pages of PDF file.
+
+    Only strokes are rendered, into overlay PDF file, which is put on top
+    of pages of the PDF file. Pages of the PDF file are not rendered, and
+    pages without strokes are copied unchanged.
+
+    :param pages: Collection of page tables.
+    :param fn_pdf: PDF file to annotate.
+    :param fn_out: Output PDF file.
+    :param jobs: Number of processes rendering the pages, use 0 for number
+        of CPUs.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    """
+    pages = [p for p in pages if len(p.strokes)]
+    if not pages:
+        shutil.copyfile(fn_pdf, fn_out)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn_overlay = os.path.join(tmp_dir, 'overlay.pdf')
+        draw_parallel(pages, None, fn_overlay, jobs, tolerance, curve)
+
+        ts = time.perf_counter()
+        numbers = [p.number for p in pages]
+        pdf_overlay(fn_pdf, fn_overlay, numbers, fn_out)
+        logger.info('added {} overlay pages in {:.2f}s'.format(
+            len(pages), time.perf_counter() - ts
+        ))
+
+def draw_pages(pages, fn_pdf, files, jobs=1, tolerance=None, curve=False):
+    """
+    Render each reMarkable tablet page into its own PDF file.
+
+    The pages are rendered by a pool of processes if number of jobs is
+    greater than one.
+
+    :param pages: Collection of page tables.
+    :param fn_pdf: PDF file to annotate or null.
+    :param files: Output PDF file for each page.
+    :param jobs: Number of processes rendering the pages, use 0 for number
+        of CPUs.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    """
+    args = (
+        ([p] for p in pages), repeat(fn_pdf), files, repeat(tolerance),
+        repeat(curve),
+    )
+    if jobs == 1:
+        list(map(draw_pdf, *args))
+    else:
+        with ProcessPoolExecutor(jobs or None) as executor:
+            list(executor.map(draw_pdf, *args))
+
+def split_pages(pages, n):
+    """
+    Split pages into `n` slices of consecutive pages of similar length.
+
+    :param pages: List of pages.
+    :param n: Number of slices.
+    """
+    k, m = divmod(len(pages), n)
+    idx = [i * k + min(i, m) for i in range(n + 1)]
+    return [pages[i:j] for i, j in zip(idx[:-1], idx[1:])]
+
+def draw_raster(pages, fn_pdf, fn_out, dpi=150, jobs=1, tolerance=None,
+        curve=False):
+    """
+    Render reMarkable tablet pages into PNG files.
+
+    The pages are rendered by a pool of threads. Each thread opens its own
+    copy of the PDF document.
+
+    Return list of PNG file names in page order.
+
+    :param pages: Collection of page tables.
+    :param fn_pdf: PDF file to annotate or null.
+    :param fn_out: Output PNG file name. Page number is inserted before
+        file extension, unless there is one page only.
+    :param dpi: Resolution of PNG files.
+    :param jobs: Number of threads rendering the pages, use 0 for number
+        of CPUs.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    """
+    pages = list(pages)
+    local = threading.local()
+
+    def render(page):
+        if fn_pdf and not hasattr(local, 'pdf_doc'):
+            local.pdf_doc = pdf_open(fn_pdf)
+        pdf_doc = local.pdf_doc if fn_pdf else None
+
+        fn = raster_fn(fn_out, page.number) if len(pages) > 1 else fn_out
+        draw_png(page, pdf_doc, fn, dpi, tolerance, curve)
+        return fn
+
+    with ThreadPoolExecutor(jobs or None) as executor:
+        return list(executor.map(render, pages))
+
+def draw_png(page, pdf_doc, fn_out, dpi=150, tolerance=None, curve=False):
+    """
+    Render reMarkable tablet page into PNG file.
+
+    :param page: Page table.
+    :param pdf_doc: PDF document to annotate or null.
+    :param fn_out: Output PNG file.
+    :param dpi: Resolution of PNG file.
+    :param tolerance: Tolerance of line simplification in reMarkable
+        tablet pixels or null for no simplification.
+    :param curve: Draw lines as cubic Bézier curves if true.
+    """
+    pdf_page = pdf_doc.get_page(page.number) if pdf_doc else None
+    if pdf_page:
+        w, h = pdf_page.get_size()
+    else:
+        w, h = const.PAGE_WIDTH, const.PAGE_HEIGHT
+
+    scale = dpi / 72
+    surface = cairo.ImageSurface(
+        cairo.FORMAT_RGB24, math.ceil(w * scale), math.ceil(h * scale)
+    )
+    try:
+        cr = cairo.Context(surface)
+        cr.set_source_rgb(1, 1, 1)
+        cr.paint()
+        cr.scale(scale, scale)
+
+        if pdf_page:
+            pdf_page.render(cr)
+            factor = pdf_scale(pdf_page)
+            cr.scale(factor, factor)
+
+        context = Context(
+            surface, cr, None, itertools.count(), tolerance, curve, []
+        )
+        draw_page(page, context)
+        surface.write_to_png(fn_out)
+    finally:
+        surface.finish()
+
+def raster_fn(fn, page_number):
+    """
+    Create PNG file name for a page.
+
+    :param fn: Output file name.
+    :param page_number: Page number.
+    """
+    base, ext = os.path.splitext(fn)
+    return '{}-{:03d}{}'.format(base, page_number, ext or '.png')
+
 # vim: sw=4:et:ai
@@ -0,0 +1,386 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Culling of strokes hidden by eraser strokes.
+
+Eraser and erase area strokes are drawn with white color on top of other
+strokes. Coverage of a page by eraser strokes is approximated with a grid
+of cells. A cell is covered only if it is fully inside of a line drawn by
+an eraser or inside of an erase area.
+
+Strokes are processed in reverse drawing order, so coverage of a page
+contains all eraser strokes drawn after a stroke. Segments of a stroke,
+which are fully inside covered cells, are removed and the remaining
+segments are split into separate strokes. Eraser strokes, which do not
+overlap any visible stroke drawn before them, are removed as well.
+"""
+
+import math
+import numpy as np
+
+from . import const, tool
+from .util import segments_bbox
+
+# size of a grid cell in reMarkable tablet pixels
+CELL = 8
+
+# margin for line simplification and cubic Bézier curves in reMarkable
+# tablet pixels
+MARGIN = 2
+
+# eraser and erase area pens
+ERASERS = (6, 8)
+
+# maximum width of a line of a stroke for each pen
+LINE_WIDTH = {
+    2: lambda s: tool.calc_width_fineliner(s) + 1,
+    4: tool.calc_width_fineliner,
+    5: lambda s: 30,
+    6: tool.calc_width_eraser,
+    7: tool.calc_width_sharp_pencil,
+    8: lambda s: 0,
+}
+
+GRID_SHAPE = (
+    math.ceil(const.PAGE_HEIGHT / CELL), math.ceil(const.PAGE_WIDTH / CELL)
+)
+
+def cull_erased(page):
+    """
+    Remove strokes and parts of strokes hidden by eraser strokes from
+    page table.
+
+    The segments array of the page table is not modified. Strokes of pens
+    not supported by the renderer are kept.
+
+    :param page: Page table.
+    """
+    strokes = page.strokes
+    if not np.isin(strokes['pen'], ERASERS).any():
+        return page
+
+    widths = line_widths(strokes)
+    points = np.column_stack((page.segments['x'], page.segments['y']))
+    items = [
+        (pen, w, points[o:o + c])
+        for pen, w, o, c in zip(
+            strokes['pen'].tolist(), widths.tolist(),
+            strokes['offset'].tolist(), strokes['count'].tolist(),
+        )
+    ]
+
+    parts = visible_erasers(items, visible_parts(items))
+
+    if len(parts) == len(strokes) \
+            and all(e - s == len(items[i][2]) for i, s, e in parts):
+        return page
+
+    idx = np.array([i for i, _, _ in parts], dtype=np.intp)
+    start = np.array([s for _, s, _ in parts], dtype=np.uint32)
+    end = np.array([e for _, _, e in parts], dtype=np.uint32)
+
+    table = strokes[idx]
+    table['offset'] += start
+    table['count'] = end - start
+
+    # update bounding box of split strokes
+    split = table['count'] != strokes['count'][idx]
+    split &= ~np.isnan(table['x1'])
+    for k in np.flatnonzero(split).tolist():
+        o, c = table['offset'][k], table['count'][k]
+        bbox = segments_bbox(page.segments[o:o + c])
+        for name, v in zip(('x1', 'y1', 'x2', 'y2'), bbox):
+            table[name][k] = v
+    return page._replace(strokes=table)
+
+def visible_parts(items):
+    """
+    Find parts of strokes not hidden by eraser strokes.
+
+    Return list of tuples of stroke index, and start and end point of
+    visible part of the stroke, in drawing order.
+
+    :param items: List of tuples of stroke pen, line width and points.
+    """
+    grid = np.zeros(GRID_SHAPE, dtype=bool)
+    sat = None
+    parts = []
+    for i in reversed(range(len(items))):
+        pen, width, points = items[i]
+        n = len(points)
+        if not n or math.isnan(width):
+            parts.append((i, 0, n))
+            continue
+
+        if sat is None:
+            sat = summed_area(grid)
+
+        r = width / 2 + MARGIN
+        lo = [v - r for v in points.min(0).tolist()]
+        hi = [v + r for v in points.max(0).tolist()]
+        if pen in ERASERS:
+            if pen == 8:
+                hidden = area_covered(sat, *points.min(0), *points.max(0))
+            else:
+                hidden = hidden_segments(sat, points, r).all()
+            if not hidden:
+                parts.append((i, 0, n))
+            if erase(grid, pen, points, width):
+                sat = None
+        elif not sat[-1, -1] or not area_count(sat, *lo, *hi):
+            # no eraser stroke over the stroke
+            parts.append((i, 0, n))
+        else:
+            hidden = hidden_segments(sat, points, r)
+            runs = split_runs(hidden, n)
+            parts.extend((i, s, e) for s, e in reversed(runs))
+
+    parts.reverse()
+    return parts
+
+def visible_erasers(items, parts):
+    """
+    Remove eraser strokes, which do not overlap any stroke drawn before
+    them.
+
+    :param items: List of tuples of stroke pen, line width and points.
+    :param parts: List of visible parts of strokes.
+    """
+    ink = np.zeros(GRID_SHAPE, dtype=bool)
+    result = []
+    for part in parts:
+        i, s, e = part
+        pen, width, points = items[i]
+        points = points[s:e]
+        if not len(points) or math.isnan(width):
+            result.append(part)
+            continue
+
+        r = width / 2 + MARGIN
+        (x1, y1), (x2, y2) = points.min(0).tolist(), points.max(0).tolist()
+        c0, r0 = max(int((x1 - r) // CELL), 0), max(int((y1 - r) // CELL), 0)
+        c1, r1 = int((x2 + r) // CELL) + 1, int((y2 + r) // CELL) + 1
+        area = np.s_[r0:max(r1, 0), c0:max(c1, 0)]
+        if pen in ERASERS:
+            if ink[area].any():
+                result.append(part)
+        else:
+            ink[area] = True
+            result.append(part)
+    return result
+
+def line_widths(strokes):
+    """
+    Calculate maximum width of line of each stroke of stroke table.
+
+    Width of a stroke of a pen not supported by the renderer is NaN.
+
+    :param strokes: Stroke table.
+    """
+    rec = strokes.view(np.recarray)
+    widths = np.full(len(strokes), np.nan)
+    for pen, calc in LINE_WIDTH.items():
+        idx = strokes['pen'] == pen
+        if idx.any():
+            widths[idx] = calc(rec[idx])
+    return widths
+
+def split_runs(hidden, n):
+    """
+    Get start and end point of each run of visible segments of a stroke.
+
+    :param hidden: Boolean array indicating hidden segments of a stroke.
+    :param n: Number of points of the stroke.
+    """
+    visible = np.concatenate(([False], ~hidden, [False])).astype(np.int8)
+    d = np.diff(visible)
+    start = np.flatnonzero(d == 1)
+    end = np.flatnonzero(d == -1)
+    # last point of a segment is the end point of a run
+    end = end + 1 if n > 1 else end
+    return list(zip(start.tolist(), end.tolist()))
+
+def hidden_segments(sat, points, r):
+    """
+    Check which segments of a stroke are hidden by covered cells.
+
+    A segment is hidden if all cells of its bounding box, extended with
+    half of line width, are covered. Single point is checked for a stroke
+    with one segment.
+
+    :param sat: Summed-area table of the coverage grid.
+    :param points: Array of points of a stroke.
+    :param r: Half of line width of the stroke.
+    """
+    if len(points) == 1:
+        return area_covered(sat, *(points[0] - r), *(points[0] + r))[None]
+
+    p1, p2 = points[:-1], points[1:]
+    lo = np.minimum(p1, p2) - r
+    hi = np.maximum(p1, p2) + r
+    return area_covered(sat, lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1])
+
+def area_covered(sat, x1, y1, x2, y2):
+    """
+    Check if all cells of an area are covered.
+
+    Areas outside of the coverage grid are not covered.
+
+    :param sat: Summed-area table of the coverage grid.
+    :param x1: Left coordinate of an area or array of coordinates.
+    :param y1: Top coordinate of an area or array of coordinates.
+    :param x2: Right coordinate of an area or array of coordinates.
+    :param y2: Bottom coordinate of an area or array of coordinates.
+    """
+    c0, r0, c1, r1 = cell_range(x1, y1, x2, y2)
+    rows, cols = GRID_SHAPE
+    inside = (c0 >= 0) & (r0 >= 0) & (c1 < cols) & (r1 < rows)
+
+    c0, c1 = np.clip(c0, 0, cols - 1), np.clip(c1, 0, cols - 1)
+    r0, r1 = np.clip(r0, 0, rows - 1), np.clip(r1, 0, rows - 1)
+    count = sat[r1 + 1, c1 + 1] - sat[r0, c1 + 1] - sat[r1 + 1, c0] \
+        + sat[r0, c0]
+    return inside & (count == (r1 - r0 + 1) * (c1 - c0 + 1))
+
+def area_count(sat, x1, y1, x2, y2):
+    """
+    Count covered cells of an area.
+
+    Area is clipped to the coverage grid.
+
+    :param sat: Summed-area table of the coverage grid.
+    :param x1: Left coordinate of an area.
+    :param y1: Top coordinate of an area.
+    :param x2: Right coordinate of an area.
+    :param y2: Bottom coordinate of an area.
+    """
+    rows, cols = GRID_SHAPE
+    clip = lambda v, n: min(max(int(v // CELL), 0), n - 1)
+    c0, c1 = clip(x1, cols), clip(x2, cols)
+    r0, r1 = clip(y1, rows), clip(y2, rows)
+    return sat[r1 + 1, c1 + 1] - sat[r0, c1 + 1] - sat[r1 + 1, c0] \
+        + sat[r0, c0]
+
+def cell_range(x1, y1, x2, y2):
+    """
+    Get column and row of top left and bottom right cells of an area.
+    """
+    to_cell = lambda v: np.floor_divide(v, CELL).astype(np.intp)
+    return to_cell(x1), to_cell(y1), to_cell(x2), to_cell(y2)
+
+def summed_area(grid):
+    """
+    Create summed-area table of the coverage grid.
+    """
+    sat = np.zeros((grid.shape[0] + 1, grid.shape[1] + 1), dtype=np.int32)
+    sat[1:, 1:] = grid.cumsum(0).cumsum(1)
+    return sat
+
+def erase(grid, pen, points, width):
+    """
+    Mark cells of the coverage grid covered by an eraser stroke.
+
+    Return true if any cell is marked.
+
+    :param grid: Coverage grid.
+    :param pen: Eraser pen.
+    :param points: Array of points of the eraser stroke.
+    :param width: Line width of the eraser stroke.
+    """
+    # distance of cell center, so the whole cell is covered
+    margin = CELL * math.sqrt(2) / 2 + MARGIN
+    if pen == 8:
+        r = 0
+    else:
+        r = width / 2 - margin
+        if r <= 0:
+            return False
+
+    lo, hi = points.min(0) - r, points.max(0) + r
+    c0, r0, c1, r1 = cell_range(*lo, *hi)
+    rows, cols = GRID_SHAPE
+    c0, r0 = max(c0, 0), max(r0, 0)
+    c1, r1 = min(c1, cols - 1), min(r1, rows - 1)
+    if c0 > c1 or r0 > r1:
+        return False
+
+    y, x = np.mgrid[r0:r1 + 1, c0:c1 + 1]
+    centers = np.column_stack((x.ravel(), y.ravel())) * CELL + CELL / 2
+
+    if pen == 8:
+        edges = np.concatenate((points, points[:1]))
+        covered = inside_polygon(centers, edges)
+        idx = np.flatnonzero(covered)
+        covered[idx] = distance(centers[idx], edges) >= margin
+    else:
+        edges = points if len(points) > 1 else points[[0, 0]]
+        covered = distance(centers, edges) <= r
+
+    cells = grid[r0:r1 + 1, c0:c1 + 1]
+    covered = covered.reshape(cells.shape) & ~cells
+    cells |= covered
+    return covered.any()
+
+def distance(points, line):
+    """
+    Calculate distance of each point to a polyline.
+
+    :param points: Array of points.
+    :param line: Array of points of the polyline.
+    """
+    result = np.full(len(points), np.inf)
+    size = max(1, 2 ** 20 // max(len(points), 1))
+    for k in range(0, len(line) - 1, size):
+        a = line[k:k + size + 1][:-1]
+        b = line[k + 1:k + size + 1]
+        d = b - a
+        length = (d ** 2).sum(1)
+        pa = points[:, None, :] - a[None, :, :]
+        t = np.divide(
+            (pa * d).sum(2), length, out=np.zeros(pa.shape[:2]),
+            where=length > 0,
+        )
+        np.clip(t, 0, 1, out=t)
+        dist = np.hypot(*(pa - t[..., None] * d).transpose(2, 0, 1))
+        np.minimum(result, dist.min(1), out=result)
+    return result
+
+def inside_polygon(points, polygon):
+    """
+    Check which points are inside of a closed polygon using even-odd rule.
+
+    :param points: Array of points.
+    :param polygon: Array of points of the polygon, last point equal to
+        first one.
+    """
+    px, py = points[:, 0, None], points[:, 1, None]
+    crossings = np.zeros(len(points), dtype=np.intp)
+    size = max(1, 2 ** 20 // max(len(points), 1))
+    for k in range(0, len(polygon) - 1, size):
+        a = polygon[k:k + size + 1][:-1]
+        b = polygon[k + 1:k + size + 1]
+        ax, ay, bx, by = a[:, 0], a[:, 1], b[:, 0], b[:, 1]
+        cond = (ay > py) != (by > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = ax + (py - ay) * (bx - ax) / (by - ay)
+        crossings += (cond & (px < x)).sum(1)
+    return crossings % 2 == 1
+
+# vim: sw=4:et:ai
@@ -37,4 +37,9 @@ class FileError(RemtError):
     File and directory exceptions.
     """
 
+class SearchError(RemtError):
+    """
+    Search index exceptions.
+    """
+
 # vim: sw=4:et:ai
@@ -0,0 +1,88 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Geometry of lines calculated by drawing tools.
+
+The lines can be simplified by removing points, which are within
+a tolerance of a line, with Ramer-Douglas-Peucker algorithm. A line can
+be also converted into cubic Bézier curves passing through its points.
+"""
+
+import numpy as np
+
+def simplify(points, tolerance):
+    """
+    Simplify line with Ramer-Douglas-Peucker algorithm.
+
+    The first and the last point of the line are always kept.
+
+    :param points: Array of points of the line.
+    :param tolerance: Maximum distance of a removed point from the
+        simplified line.
+    """
+    n = len(points)
+    if n < 3:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+
+        a = points[i]
+        d = points[j] - a
+        p = points[i + 1:j] - a
+        norm = np.hypot(*d)
+        if norm:
+            dist = np.abs(d[0] * p[:, 1] - d[1] * p[:, 0]) / norm
+        else:
+            dist = np.hypot(p[:, 0], p[:, 1])
+
+        k = dist.argmax()
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+
+    return points[keep]
+
+def to_curves(points):
+    """
+    Convert line into cubic Bézier curves passing through its points.
+
+    Catmull-Rom spline is used to calculate control points of the
+    curves. The result is an array of shape `(n - 1, 3, 2)` for `n`
+    points, where each curve is defined by its two control points and
+    end point. The first point of the line is start point of the first
+    curve.
+
+    :param points: Array of points of the line.
+    """
+    p = np.concatenate((points[:1], points, points[-1:]))
+    c1 = p[1:-2] + (p[2:-1] - p[:-3]) / 6
+    c2 = p[2:-1] - (p[3:] - p[1:-2]) / 6
+    return np.stack((c1, c2, p[2:-1]), axis=1)
+
+# vim: sw=4:et:ai
@@ -21,12 +21,18 @@
 reMarkable tablet lines format parser.
 """
 
+import io
 import math
-import os.path
+import mmap
+import numpy as np
 import struct
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
 
 from .data import *
-from .util import flatten
+from .erase import cull_erased
+from .util import segments_bbox
 
 
 HEADER_START = b'reMarkable .lines file, version=3' + b' ' * 10
@@ -36,6 +42,141 @@ FMT_LAYER = struct.Struct('<I')
 FMT_STROKE = struct.Struct('<IIIfI')
 FMT_SEGMENT = struct.Struct('<ffffff')
 
+# segment data is decoded with single read of all segments of a stroke
+assert DTYPE_SEGMENT.itemsize == FMT_SEGMENT.size
+
+# data types, which can be parsed without reading from a file object
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+class BufferReader:
+    """
+    Reader of reMarkable lines data held in memory, i.e. bytes, memory view
+    or memory mapped file.
+
+    Data items are unpacked at the offset of the reader. The data is not
+    copied.
+
+    :var buffer: Memory view of the data.
+    :var offset: Current offset of the reader.
+    """
+    __slots__ = ('buffer', 'offset')
+
+    def __init__(self, data):
+        self.buffer = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt):
+        """
+        Parse data of a drawing item at current offset using a format.
+
+        :param fmt: Struct format object.
+        """
+        value = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return value
+
+    def read(self, size):
+        """
+        Get view of data of a size at current offset.
+
+        :param size: Size of the data.
+        """
+        start = self.offset
+        self.offset += size
+        return self.buffer[start:self.offset]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        Change offset of the reader.
+
+        :param offset: Offset relative to position indicated by `whence`.
+        :param whence: Start, current or end position of the data.
+        """
+        if whence == io.SEEK_CUR:
+            offset += self.offset
+        elif whence == io.SEEK_END:
+            offset += len(self.buffer)
+        self.offset = offset
+        return offset
+
+    def tell(self):
+        """
+        Get current offset of the reader.
+        """
+        return self.offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.buffer.release()
+
+
+class StreamReader:
+    """
+    Reader of reMarkable lines data from asynchronous byte stream, i.e.
+    SFTP file object.
+
+    The data is read from the stream in blocks and buffered.
+
+    :var stream: Asynchronous byte stream with `read` coroutine.
+    :var buffer: Buffered data.
+    :var offset: Offset of the reader in the buffered data.
+    :var block: Minimal size of data read from the stream.
+    """
+    __slots__ = ('stream', 'buffer', 'offset', 'block')
+
+    def __init__(self, stream, block=64 * 1024):
+        self.stream = stream
+        self.buffer = b''
+        self.offset = 0
+        self.block = block
+
+    async def unpack(self, fmt):
+        """
+        Parse data of a drawing item using a format.
+
+        :param fmt: Struct format object.
+        """
+        await self.fill(fmt.size)
+        value = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return value
+
+    async def read(self, size):
+        """
+        Read data of a size.
+
+        :param size: Size of the data.
+        """
+        await self.fill(size)
+        start = self.offset
+        self.offset += size
+        return self.buffer[start:self.offset]
+
+    async def fill(self, size):
+        """
+        Read data from the stream until data of a size is buffered or
+        end of the stream is reached.
+
+        :param size: Size of the data.
+        """
+        available = len(self.buffer) - self.offset
+        if available >= size:
+            return
+
+        chunks = [self.buffer[self.offset:]]
+        while available < size:
+            chunk = await self.stream.read(max(size - available, self.block))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            available += len(chunk)
+
+        self.buffer = b''.join(chunks)
+        self.offset = 0
+
 
 def parse_item(fmt, fin):
     """
@@ -43,44 +184,390 @@ def parse_item(fmt, fin):
     using a format.
 
     :param fmt: Struct format object.
-    :param fin: File object.
+    :param fin: File object or buffer reader.
     """
+    if isinstance(fin, BufferReader):
+        return fin.unpack(fmt)
+
     buff = fin.read(fmt.size)
     return fmt.unpack(buff)
 
-def parse_segment(n_seg, data):
-    x, y, speed, direction, width, pressure = parse_item(FMT_SEGMENT, data)
-    return Segment(n_seg, x, y, speed, direction, width, pressure)
+@contextmanager
+def data_reader(data):
+    """
+    Create reader of reMarkable lines data.
 
-def parse_stroke(n_stroke, data):
-    pen, color, _, width, n = parse_item(FMT_STROKE, data)
+    Buffer reader is created for a buffer, i.e. bytes, memory view or
+    memory mapped file. File object is used as it is.
 
-    segments = [parse_segment(i, data) for i in range(n)]
-    stroke = Stroke(n_stroke, pen, color, width, segments)
+    :param data: File object or buffer.
+    """
+    if isinstance(data, BUFFER_TYPES):
+        with BufferReader(data) as reader:
+            yield reader
+    else:
+        yield data
 
-    yield stroke
+def parse_table(data, page_number, select=None):
+    """
+    Parse reMarkable lines data into page table.
 
-def parse_layer(n_layer, data):
-    n, = parse_item(FMT_LAYER, data)
+    The data can be a file object or a buffer, i.e. bytes, memory view or
+    memory mapped file. A buffer is parsed without reading and copying
+    the data of each drawing item.
 
-    items = (parse_stroke(i, data) for i in range(n))
+    Strokes not matching stroke filter are skipped without reading their
+    segments. If stroke filter requests bounding boxes only, then no
+    segments are stored in the page table.
 
-    yield Layer(n_layer)
-    yield from flatten(items)
-    
-def parse_page(data, page_number):
-    n, _, _ = parse_item(FMT_PAGE, data)
-    items = (parse_layer(i, data) for i in range(n))
+    :param data: File object or buffer.
+    :param page_number: Page number to be associated with the page.
+    :param select: Optional stroke filter.
+    """
+    with data_reader(data) as reader:
+        return parse_table_data(reader, page_number, select)
 
-    yield Page(page_number)
-    yield from flatten(items)
-    yield PageEnd(page_number)
+def parse_table_data(data, page_number, select=None):
+    header, *_ = parse_item(FMT_HEADER_PAGE, data)
+    assert header == HEADER_START
+
+    n_layers, _, _ = parse_item(FMT_PAGE, data)
+
+    pens = select.pens if select else None
+    layers = select.layers if select else None
+    bbox = select.bbox if select else False
+    no_bbox = (math.nan,) * 4
+
+    strokes = []
+    segments = []
+    offset = 0
+    for n_layer in range(n_layers):
+        n, = parse_item(FMT_LAYER, data)
+        skip_layer = layers is not None and n_layer not in layers
+        for n_stroke in range(n):
+            pen, color, _, width, count = parse_item(FMT_STROKE, data)
+            size = count * FMT_SEGMENT.size
+
+            if skip_layer or pens is not None and pen not in pens:
+                data.seek(size, io.SEEK_CUR)
+                continue
+
+            buff = data.read(size)
+            if bbox:
+                extent = segments_bbox(np.frombuffer(buff, dtype=DTYPE_SEGMENT))
+                count = 0
+            else:
+                segments.append(buff)
+                extent = no_bbox
+
+            strokes.append(
+                (n_layer, n_stroke, pen, color, width, offset, count, *extent)
+            )
+            offset += count
 
-def parse(data, page_number):
+    strokes = np.array(strokes, dtype=DTYPE_STROKE)
+    # single copy of the segments data, so a buffer can be released
+    # after parsing
+    segments = np.frombuffer(b''.join(segments), dtype=DTYPE_SEGMENT)
+    if not bbox:
+        strokes_bbox(strokes, segments)
+    return PageTable(page_number, n_layers, strokes, segments)
+
+def strokes_bbox(strokes, segments):
+    """
+    Calculate bounding box of each stroke of stroke table.
+
+    The stroke table is updated in place. Bounding box of a stroke
+    without segments is not calculated.
+
+    :param strokes: Stroke table.
+    :param segments: NumPy array of segments of the strokes.
+    """
+    idx = strokes['count'] > 0
+    offset = strokes['offset'][idx]
+    if not len(offset):
+        return
+
+    items = (
+        ('x1', 'x', np.minimum), ('y1', 'y', np.minimum),
+        ('x2', 'x', np.maximum), ('y2', 'y', np.maximum),
+    )
+    for name, field, f in items:
+        strokes[name][idx] = f.reduceat(segments[field], offset)
+
+def parse_index(data):
+    """
+    Create index of layers and strokes of reMarkable lines data.
+
+    Byte offset, pen, color and number of segments of each stroke is
+    stored in the index. The segments are not parsed.
+
+    The index is part of library API only. It allows an application to
+    select arbitrary strokes of a page and parse them with
+    :py:func:`remt.parser.parse_strokes` function. The `remt` commands
+    use :py:func:`remt.parser.parse_table` function with a stroke filter,
+    which skips segments of strokes not matching the filter in a single
+    pass.
+
+    :param data: File object or buffer.
+    """
+    with data_reader(data) as reader:
+        return parse_index_data(reader)
+
+def parse_index_data(data):
     header, *_ = parse_item(FMT_HEADER_PAGE, data)
     assert header == HEADER_START
 
-    yield from parse_page(data, page_number)
+    n_layers, _, _ = parse_item(FMT_PAGE, data)
+
+    layers = []
+    strokes = []
+    for n_layer in range(n_layers):
+        layer_offset = data.tell()
+        n, = parse_item(FMT_LAYER, data)
+        layers.append((n_layer, layer_offset, n))
+        for n_stroke in range(n):
+            offset = data.tell()
+            pen, color, _, width, count = parse_item(FMT_STROKE, data)
+            data.seek(count * FMT_SEGMENT.size, io.SEEK_CUR)
+            strokes.append((n_layer, n_stroke, pen, color, width, offset, count))
+
+    layers = np.array(layers, dtype=DTYPE_LAYER_INDEX)
+    strokes = np.array(strokes, dtype=DTYPE_STROKE_INDEX)
+    return PageIndex(layers, strokes)
+
+def parse_strokes(data, page_number, index, strokes):
+    """
+    Parse selected strokes of reMarkable lines data into page table.
+
+    Only segments of the selected strokes are read from the data.
+
+    :param data: File object or buffer.
+    :param page_number: Page number to be associated with the page.
+    :param index: Index of reMarkable lines data.
+    :param strokes: Selected rows of the stroke index.
+    """
+    items = zip(strokes['offset'].tolist(), strokes['count'].tolist())
+    segments = []
+    with data_reader(data) as reader:
+        for offset, count in items:
+            reader.seek(offset + FMT_STROKE.size)
+            segments.append(reader.read(count * FMT_SEGMENT.size))
+        segments = np.frombuffer(b''.join(segments), dtype=DTYPE_SEGMENT)
+
+    table = to_stroke_table(strokes)
+    strokes_bbox(table, segments)
+    return PageTable(page_number, len(index.layers), table, segments)
+
+def to_stroke_table(strokes):
+    """
+    Convert rows of stroke index into stroke table.
+
+    Segments of strokes are assumed to be stored one after another in
+    segments array of a page.
+
+    :param strokes: Rows of the stroke index.
+    """
+    count = strokes['count']
+    table = np.empty(len(strokes), dtype=DTYPE_STROKE)
+    for name in ('layer', 'number', 'pen', 'color', 'width', 'count'):
+        table[name] = strokes[name]
+    for name in ('x1', 'y1', 'x2', 'y2'):
+        table[name] = math.nan
+    table['offset'] = np.cumsum(count) - count
+    return table
+
+def filter_table(page, select):
+    """
+    Filter strokes of page table with a stroke filter.
+
+    :param page: Page table.
+    :param select: Stroke filter.
+    """
+    strokes = page.strokes
+    idx = np.ones(len(strokes), dtype=bool)
+    if select.pens is not None:
+        idx &= np.isin(strokes['pen'], list(select.pens))
+    if select.layers is not None:
+        idx &= np.isin(strokes['layer'], list(select.layers))
+
+    if select.bbox:
+        segments = np.empty(0, dtype=DTYPE_SEGMENT)
+        count = np.zeros(idx.sum(), dtype=np.uint32)
+    else:
+        segments = page.segments[np.repeat(idx, strokes['count'])]
+        count = strokes['count'][idx]
+
+    strokes = strokes[idx]
+    strokes['count'] = count
+    strokes['offset'] = np.cumsum(count) - count
+    return page._replace(strokes=strokes, segments=segments)
+
+def page_items(page, array=False):
+    """
+    Convert page table into drawing items.
+
+    Strokes and parts of strokes hidden by eraser strokes are removed, see
+    :py:func:`remt.erase.cull_erased`.
+
+    Segments of a stroke are view of segments array of the page, see
+    :py:class:`remt.data.SegmentView`. If `array` parameter is true, then
+    segments of a stroke are NumPy structured array.
+
+    :param page: Page table.
+    :param array: Use NumPy array for segments of a stroke if true.
+    """
+    yield from _page_items(cull_erased(page), array)
+
+def _page_items(page, array=False):
+    """
+    Convert page table into drawing items without removing strokes hidden
+    by eraser strokes.
+    """
+    to_segments = (lambda v: v) if array else SegmentView
+    segments = page.segments
+    layers = groupby(page.strokes.tolist(), itemgetter(0))
+    layers = {k: list(v) for k, v in layers}
+
+    yield Page(page.number)
+    for n_layer in range(page.layers):
+        yield Layer(n_layer)
+        strokes = layers.get(n_layer, [])
+        for _, n, pen, color, width, offset, count, *extent in strokes:
+            items = to_segments(segments[offset:offset + count])
+            bbox = None if math.isnan(extent[0]) else BBox(*extent)
+            yield Stroke(n, pen, color, width, items, bbox)
+    yield PageEnd(page.number)
+
+def parse(data, page_number, array=False, select=None):
+    """
+    Parse reMarkable lines data.
+
+    The data can be a file object or a buffer, i.e. bytes, memory view or
+    memory mapped file.
+
+    Segments of a stroke are sequence of segment tuples by default. If
+    `array` parameter is true, then segments of a stroke are NumPy
+    structured array, see :py:data:`remt.data.DTYPE_SEGMENT`.
+
+    Use stroke filter to parse strokes of selected pens or layers only, or
+    to parse bounding box of strokes without segments, see
+    :py:class:`remt.data.StrokeFilter`.
+
+    All parsed strokes are yielded, including strokes hidden by eraser
+    strokes. Use :py:func:`remt.parser.page_items` function to draw a page
+    without hidden strokes.
+
+    :param data: File object or buffer.
+    :param page_number: Page number to be associated with the page.
+    :param array: Decode segments of a stroke into NumPy array if true.
+    :param select: Optional stroke filter.
+    """
+    page = parse_table(data, page_number, select)
+    yield from _page_items(page, array)
+
+async def parse_async(stream, page_number, select=None):
+    """
+    Parse reMarkable lines data from asynchronous byte stream.
+
+    Drawing items are yielded as soon as their data is read from the
+    stream. Segments of a stroke are sequence of segment tuples, see
+    :py:class:`remt.data.SegmentView`.
+
+    All parsed strokes are yielded, including strokes hidden by eraser
+    strokes. Use :py:func:`remt.parser.parse_table` and
+    :py:func:`remt.parser.page_items` functions to draw a page without
+    hidden strokes.
+
+    :param stream: Asynchronous byte stream with `read` coroutine, i.e.
+        SFTP file object.
+    :param page_number: Page number to be associated with the page.
+    :param select: Optional stroke filter.
+    """
+    reader = StreamReader(stream)
+    header, *_ = await reader.unpack(FMT_HEADER_PAGE)
+    assert header == HEADER_START
+
+    n_layers, _, _ = await reader.unpack(FMT_PAGE)
+
+    pens = select.pens if select else None
+    layers = select.layers if select else None
+    bbox = select.bbox if select else False
+    no_segments = np.empty(0, dtype=DTYPE_SEGMENT)
+
+    yield Page(page_number)
+    for n_layer in range(n_layers):
+        n, = await reader.unpack(FMT_LAYER)
+        skip_layer = layers is not None and n_layer not in layers
+
+        yield Layer(n_layer)
+        for n_stroke in range(n):
+            pen, color, _, width, count = await reader.unpack(FMT_STROKE)
+            buff = await reader.read(count * FMT_SEGMENT.size)
+            if skip_layer or pens is not None and pen not in pens:
+                continue
+
+            segments = np.frombuffer(buff, dtype=DTYPE_SEGMENT)
+            extent = segments_bbox(segments)
+            if bbox:
+                segments = no_segments
+            stroke_box = None if math.isnan(extent[0]) else BBox(*extent)
+
+            yield Stroke(
+                n_stroke, pen, color, width, SegmentView(segments), stroke_box
+            )
+    yield PageEnd(page_number)
+
+async def parse_table_async(stream, page_number, select=None):
+    """
+    Parse reMarkable lines data from asynchronous byte stream into page
+    table.
+
+    Segments of each stroke are decoded by
+    :py:func:`remt.parser.parse_async` function as soon as their data is
+    read from the stream, so only the data of a stroke is buffered.
+
+    :param stream: Asynchronous byte stream with `read` coroutine, i.e.
+        SFTP file object.
+    :param page_number: Page number to be associated with the page.
+    :param select: Optional stroke filter.
+    """
+    no_bbox = (math.nan,) * 4
+
+    n_layers = 0
+    strokes = []
+    segments = []
+    offset = 0
+    async for item in parse_async(stream, page_number, select):
+        if isinstance(item, Layer):
+            n_layers += 1
+        elif isinstance(item, Stroke):
+            items = item.segments.array
+            count = len(items)
+            extent = item.bbox or no_bbox
+            strokes.append((
+                n_layers - 1, item.number, item.pen, item.color, item.width,
+                offset, count, *extent
+            ))
+            segments.append(items)
+            offset += count
+
+    strokes = np.array(strokes, dtype=DTYPE_STROKE)
+    if segments:
+        segments = np.concatenate(segments)
+    else:
+        segments = np.empty(0, dtype=DTYPE_SEGMENT)
+    return PageTable(page_number, n_layers, strokes, segments)
+
+def empty_table(page_number):
+    """
+    Create empty page table.
+
+    :param page_number: Page number to be associated with the page.
+    """
+    strokes = np.empty(0, dtype=DTYPE_STROKE)
+    segments = np.empty(0, dtype=DTYPE_SEGMENT)
+    return PageTable(page_number, 0, strokes, segments)
 
 def empty_page(page_number):
     """
@@ -24,12 +24,18 @@ PDF utilities.
 import gi
 gi.require_version('Poppler', '0.18')
 
+import numpy as np
 import pathlib
+import pypdf
 from gi.repository import Poppler
 
 from . import const
-from .util import to_point
+from .spatial import bbox_index, intersects
+from .util import stroke_bbox
 
+# horizontal margin of highlighted area of a PDF page in reMarkable tablet
+# pixels
+HIGHLIGHT_MARGIN = 15
 
 def pdf_open(fn):
     """
@@ -40,6 +46,27 @@ def pdf_open(fn):
     path = pathlib.Path(fn).resolve().as_uri()
     return Poppler.Document.new_from_file(path)
 
+def pdf_page_count(fn):
+    """
+    Get number of pages of a PDF file.
+
+    Only trailer, cross-reference table and page tree root of the PDF file
+    are read. Poppler library is used if the page tree cannot be read.
+
+    :param fn: PDF file name.
+    """
+    try:
+        with open(fn, 'rb') as f:
+            reader = pypdf.PdfReader(f)
+            count = reader.trailer['/Root']['/Pages']['/Count']
+            count = int(count)
+    except (pypdf.errors.PyPdfError, KeyError, TypeError, ValueError):
+        count = 0
+
+    if count < 1:
+        count = pdf_open(fn).get_n_pages()
+    return count
+
 def pdf_scale(page):
     """
     Get scaling factor for a PDF page to fit reMarkable tablet vector data
@@ -57,19 +84,23 @@ def pdf_area(page, stroke):
     :param page: Poppler PDF page object.
     :param stroke: reMarkable tablet stroke data.
     """
-    to_x = lambda p: to_point(p)[0]
-    to_y = lambda p: to_point(p)[1]
-    x1 = min(to_x(s) for s in stroke.segments)
-    x2 = max(to_x(s) for s in stroke.segments)
-    y1 = min(to_y(s) for s in stroke.segments)
-    y2 = max(to_y(s) for s in stroke.segments)
+    return pdf_rect(page, stroke_bbox(stroke))
+
+def pdf_rect(page, bbox):
+    """
+    Get PDF page area for a bounding box of a stroke.
+
+    :param page: Poppler PDF page object.
+    :param bbox: Bounding box of a stroke.
+    """
+    x1, y1, x2, y2 = bbox
 
     factor = pdf_scale(page)
 
     area = Poppler.Rectangle()
-    area.x1 = (x1 - 15) * factor
+    area.x1 = (x1 - HIGHLIGHT_MARGIN) * factor
     area.y1 = y1 * factor
-    area.x2 = (x2 + 15) * factor
+    area.x2 = (x2 + HIGHLIGHT_MARGIN) * factor
     area.y2 = y2 * factor
     assert area.x1 < area.x2
     assert area.y1 < area.y2
@@ -87,4 +118,126 @@ def pdf_text(page, stroke):
     area = pdf_area(page, stroke)
     return page.get_text_for_area(area)
 
+def pdf_texts(page, index, strokes=None):
+    """
+    Get text annotated by strokes stored in spatial index.
+
+    Text and layout of text of the PDF page is read once for all strokes.
+    A character is annotated by a stroke if center of the character is
+    within PDF page area of the stroke, see :py:func:`pdf_rect`.
+
+    Texts are returned in order of strokes in stroke table.
+
+    :param page: Poppler PDF page object.
+    :param index: Spatial index of strokes of a page.
+    :param strokes: Indexes of strokes in stroke table or null for all
+        indexed strokes.
+    """
+    if strokes is None:
+        strokes = np.unique(index.items)
+    if not len(strokes):
+        return []
+
+    text, layout = pdf_text_layout(page)
+    center = (layout.bbox[:, :2] + layout.bbox[:, 2:]) / 2
+    m = HIGHLIGHT_MARGIN
+    return [
+        area_text(text, layout, center, (x1 - m, y1, x2 + m, y2))
+        for x1, y1, x2, y2 in index.bbox[strokes].tolist()
+    ]
+
+def pdf_text_layout(page):
+    """
+    Get text of PDF page and spatial index of its characters.
+
+    Bounding boxes of the characters are converted to reMarkable tablet
+    coordinates.
+
+    :param page: Poppler PDF page object.
+    """
+    text = page.get_text()
+    _, layout = page.get_text_layout()
+    bbox = [(r.x1, r.y1, r.x2, r.y2) for r in layout]
+    bbox = np.array(bbox, dtype=float).reshape(-1, 4) / pdf_scale(page)
+
+    n = min(len(text), len(bbox))
+    return text[:n], bbox_index(bbox[:n])
+
+def area_text(text, layout, center, area):
+    """
+    Get text of characters within an area.
+
+    Characters are returned in text order. New lines between the
+    characters are kept.
+
+    :param text: Text of PDF page.
+    :param layout: Spatial index of characters of the text.
+    :param center: Array of centers of the characters.
+    :param area: Area in reMarkable tablet coordinates.
+    """
+    x1, y1, x2, y2 = area
+    found = intersects(layout, *area)
+    x, y = center[found].T
+    found = found[(x >= x1) & (x <= x2) & (y >= y1) & (y <= y2)].tolist()
+    if not found:
+        return ''
+
+    found = set(found)
+    items = range(min(found), max(found) + 1)
+    items = (text[i] for i in items if i in found or text[i] == '\n')
+    return ''.join(items).strip()
+
+def pdf_merge(files, fn_out):
+    """
+    Merge PDF files into single PDF file.
+
+    The pages are copied without rendering them again.
+
+    :param files: Collection of PDF files in page order.
+    :param fn_out: Output PDF file.
+    """
+    writer = pypdf.PdfWriter()
+    for fn in files:
+        writer.append(fn)
+    with open(fn_out, 'wb') as f:
+        writer.write(f)
+
+def pdf_overlay(fn_pdf, fn_overlay, numbers, fn_out):
+    """
+    Put pages of overlay PDF file on top of pages of PDF file.
+
+    Page objects and content streams of the PDF file are kept. Content of
+    an overlay page is added to the page, so pages without overlay are
+    copied unchanged.
+
+    The overlay pages have size of reMarkable tablet page. An overlay
+    page is scaled to fit a PDF page in the same way as reMarkable tablet
+    strokes are scaled by :py:func:`pdf_scale`.
+
+    :param fn_pdf: PDF file.
+    :param fn_overlay: Overlay PDF file.
+    :param numbers: Number of PDF page for each overlay page.
+    :param fn_out: Output PDF file.
+    """
+    writer = pypdf.PdfWriter(clone_from=fn_pdf)
+    overlay = pypdf.PdfReader(fn_overlay)
+    for n, page in zip(numbers, overlay.pages):
+        target = writer.pages[n]
+        if target.rotation:
+            target.transfer_rotation_to_content()
+
+        box = target.cropbox
+        w, h = float(box.width), float(box.height)
+        factor = max(w / const.PAGE_WIDTH, h / const.PAGE_HEIGHT)
+        # overlay page origin is at bottom left corner, while the strokes
+        # are drawn from top left corner of PDF page
+        dy = h - const.PAGE_HEIGHT * factor
+        ctm = pypdf.Transformation() \
+            .scale(factor, factor) \
+            .translate(float(box.left), float(box.bottom) + dy)
+        target.merge_transformed_page(page, ctm)
+
+    with open(fn_out, 'wb') as f:
+        writer.write(f)
+
 # vim: sw=4:et:ai
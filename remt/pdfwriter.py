@@ -0,0 +1,275 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+PDF file writer drawing reMarkable tablet strokes directly into PDF page
+content streams.
+
+The writer implements subset of Cairo library surface and context API
+used by `remt` project renderer. Line join, line cap and color alpha are
+stored as graphics state parameter dictionaries shared by all pages of
+a PDF file. Array of points is converted into path operators with single
+string formatting operation.
+
+Brushes and rendering of PDF documents are not supported.
+"""
+
+import zlib
+
+from .geom import to_curves
+
+FMT_MOVE = '%.2f %.2f m\n'
+FMT_LINE = '%.2f %.2f l\n'
+FMT_CURVE = '%.2f %.2f %.2f %.2f %.2f %.2f c\n'
+
+# object numbers of catalog, page tree and page resources
+OBJ_CATALOG = 1
+OBJ_PAGES = 2
+OBJ_RESOURCES = 3
+
+class PDFSurface:
+    """
+    PDF file surface.
+
+    Page content is written into the file, when a page is finished.
+
+    :var content: Content stream operators of current page.
+    """
+    def __init__(self, fn, width, height):
+        self._file = open(fn, 'wb')
+        self._offsets = {}
+        self._next = OBJ_RESOURCES + 1
+        self._pages = []
+        self._states = {}
+        self._size = width, height
+        self.content = []
+
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def set_size(self, width, height):
+        """
+        Set size of current page.
+        """
+        self._size = width, height
+
+    def gs_name(self, state):
+        """
+        Get name of graphics state parameter dictionary.
+
+        :param state: Tuple of line join, line cap and color alpha.
+        """
+        name = self._states.get(state)
+        if name is None:
+            name = self._states[state] = 'GS{}'.format(len(self._states))
+        return name
+
+    def show_page(self):
+        """
+        Write current page into PDF file and start new page.
+        """
+        w, h = self._size
+        # use coordinate system of Cairo library with origin at top left
+        # corner of a page
+        content = ['1 0 0 -1 0 {} cm\n'.format(h), *self.content]
+        data = zlib.compress(''.join(content).encode('ascii'))
+        self.content = []
+
+        obj_content = self._write_stream(
+            '<< /Length {} /Filter /FlateDecode >>'.format(len(data)), data
+        )
+        obj_page = self._write_object(
+            '<< /Type /Page /Parent {} 0 R /MediaBox [0 0 {} {}]'
+            ' /Resources {} 0 R /Contents {} 0 R >>'
+            .format(OBJ_PAGES, w, h, OBJ_RESOURCES, obj_content)
+        )
+        self._pages.append(obj_page)
+
+    def finish(self):
+        """
+        Write last page, shared resources and cross-reference table into
+        PDF file and close the file.
+        """
+        if self._file.closed:
+            return
+
+        self.show_page()
+
+        states = [
+            '/{} {} 0 R'.format(
+                name,
+                self._write_object(
+                    '<< /Type /ExtGState /LJ {} /LC {} /CA {} /ca {} >>'
+                    .format(join, cap, alpha, alpha)
+                ),
+            )
+            for (join, cap, alpha), name in self._states.items()
+        ]
+        self._write_object(
+            '<< /ExtGState << {} >> >>'.format(' '.join(states)),
+            OBJ_RESOURCES,
+        )
+        kids = ' '.join('{} 0 R'.format(n) for n in self._pages)
+        self._write_object(
+            '<< /Type /Pages /Kids [{}] /Count {} >>'
+            .format(kids, len(self._pages)),
+            OBJ_PAGES,
+        )
+        self._write_object(
+            '<< /Type /Catalog /Pages {} 0 R >>'.format(OBJ_PAGES),
+            OBJ_CATALOG,
+        )
+
+        f = self._file
+        start = f.tell()
+        size = self._next
+        f.write('xref\n0 {}\n0000000000 65535 f \n'.format(size).encode())
+        f.write(''.join(
+            '{:010d} 00000 n \n'.format(self._offsets[n])
+            for n in range(1, size)
+        ).encode())
+        f.write(
+            'trailer\n<< /Size {} /Root {} 0 R >>\nstartxref\n{}\n%%EOF\n'
+            .format(size, OBJ_CATALOG, start).encode()
+        )
+        f.close()
+
+    def _write_object(self, data, number=None):
+        return self._write_stream(data, None, number)
+
+    def _write_stream(self, data, stream, number=None):
+        if number is None:
+            number = self._next
+            self._next += 1
+
+        f = self._file
+        self._offsets[number] = f.tell()
+        f.write('{} 0 obj\n{}\n'.format(number, data).encode())
+        if stream is not None:
+            f.write(b'stream\n')
+            f.write(stream)
+            f.write(b'\nendstream\n')
+        f.write(b'endobj\n')
+        return number
+
+class PDFContext:
+    """
+    Drawing context writing operators into content stream of current page
+    of PDF surface.
+    """
+    def __init__(self, surface):
+        self.surface = surface
+        self._state = (0, 0, 1)
+        self._state_pdf = self._state
+        self._stack = []
+        self._path = False
+
+    def save(self):
+        self._write('q\n')
+        self._stack.append((self._state, self._state_pdf))
+
+    def restore(self):
+        self._write('Q\n')
+        self._state, self._state_pdf = self._stack.pop()
+
+    def set_source_rgba(self, r, g, b, a=1):
+        self._write('{0} {1} {2} RG {0} {1} {2} rg\n'.format(r, g, b))
+        self._set_state(alpha=a)
+
+    def set_source(self, source):
+        """
+        Brushes are not supported, so the source is ignored.
+        """
+
+    def set_line_join(self, join):
+        self._set_state(join=int(join))
+
+    def set_line_cap(self, cap):
+        self._set_state(cap=int(cap))
+
+    def set_line_width(self, width):
+        self._write('{} w\n'.format(width))
+
+    def new_path(self):
+        if self._path:
+            self._write('n\n')
+            self._path = False
+
+    def move_to(self, x, y):
+        self._start_path()
+        self._write(FMT_MOVE % (x, y))
+
+    def line_to(self, x, y):
+        self._write(FMT_LINE % (x, y))
+
+    def curve_to(self, x1, y1, x2, y2, x3, y3):
+        self._write(FMT_CURVE % (x1, y1, x2, y2, x3, y3))
+
+    def close_path(self):
+        self._write('h\n')
+
+    def stroke(self):
+        self._write('S\n')
+        self._path = False
+
+    def fill(self):
+        self._write('f\n')
+        self._path = False
+
+    def add_path(self, points, curve=False):
+        """
+        Add line or cubic Bézier curves through array of points to current
+        path.
+
+        :param points: Array of points of shape `(n, 2)`.
+        :param curve: Add cubic Bézier curves if true.
+        """
+        n = len(points)
+        if not n:
+            return
+
+        self._start_path()
+        if curve and n > 2:
+            curves = to_curves(points)
+            fmt = FMT_MOVE + FMT_CURVE * len(curves)
+            data = (*points[0].tolist(), *curves.ravel().tolist())
+        else:
+            fmt = FMT_MOVE + FMT_LINE * (n - 1)
+            data = tuple(points.ravel().tolist())
+        self._write(fmt % data)
+
+    def _set_state(self, join=None, cap=None, alpha=None):
+        old_join, old_cap, old_alpha = self._state
+        self._state = (
+            old_join if join is None else join,
+            old_cap if cap is None else cap,
+            old_alpha if alpha is None else alpha,
+        )
+
+    def _start_path(self):
+        # graphics state cannot be changed while a path is constructed
+        if not self._path and self._state != self._state_pdf:
+            name = self.surface.gs_name(self._state)
+            self._write('/{} gs\n'.format(name))
+            self._state_pdf = self._state
+        self._path = True
+
+    def _write(self, data):
+        self.surface.content.append(data)
+
+# vim: sw=4:et:ai
@@ -0,0 +1,158 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Search index of highlighted text of documents of reMarkable tablet
+library.
+
+The index is SQLite database with full text search table of highlighted
+text, PDF page labels and document paths. Fingerprint of each indexed
+document is stored, so only modified documents are indexed again.
+"""
+
+import os
+import os.path
+import sqlite3
+from collections import namedtuple
+
+from .error import SearchError
+
+SCHEMA = """\
+create table if not exists document (
+    uuid text primary key,
+    path text not null,
+    fingerprint text not null
+);
+create virtual table if not exists highlight using fts5(
+    text, label, path, uuid unindexed, page unindexed
+);
+"""
+
+SQL_SEARCH = """\
+select path, label, text
+from highlight
+where highlight match ?
+order by rank
+"""
+
+# path: document path
+# label: PDF page label
+# text: highlighted text
+SearchResult = namedtuple('SearchResult', ['path', 'label', 'text'])
+
+def search_open(fn):
+    """
+    Open search index database, and create it if it does not exist.
+
+    :param fn: Database file name.
+    """
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    db = sqlite3.connect(fn)
+    db.executescript(SCHEMA)
+    return db
+
+def stale_documents(db, documents):
+    """
+    Find documents, which need to be indexed.
+
+    Path of a moved, but not modified document is updated. Return tuple
+    of list of UUIDs of documents to index and list of UUIDs of
+    documents to remove from the index.
+
+    :param db: Search index database.
+    :param documents: Dictionary of document UUID and tuple of document
+        path and fingerprint.
+    """
+    indexed = db.execute('select uuid, path, fingerprint from document')
+    indexed = {u: (p, f) for u, p, f in indexed}
+
+    moved = [
+        (documents[u][0], u) for u, (p, f) in indexed.items()
+        if u in documents and documents[u] != (p, f)
+        and documents[u][1] == f
+    ]
+    with db:
+        db.executemany('update document set path = ? where uuid = ?', moved)
+        db.executemany('update highlight set path = ? where uuid = ?', moved)
+
+    stale = [
+        u for u, (_, f) in documents.items()
+        if u not in indexed or indexed[u][1] != f
+    ]
+    removed = [u for u in indexed if u not in documents]
+    return stale, removed
+
+def store_document(db, uuid, path, fingerprint, pages):
+    """
+    Store highlighted text of a document in the search index.
+
+    Previously indexed text of the document is replaced.
+
+    :param db: Search index database.
+    :param uuid: Document UUID.
+    :param path: Document path.
+    :param fingerprint: Document fingerprint.
+    :param pages: Collection of tuples of PDF page label, PDF page index
+        and list of highlighted texts.
+    """
+    items = (
+        (text, label, path, uuid, n)
+        for label, n, texts in pages for text in texts if text
+    )
+    with db:
+        db.execute('delete from highlight where uuid = ?', (uuid,))
+        db.executemany(
+            'insert into highlight (text, label, path, uuid, page)'
+            ' values (?, ?, ?, ?, ?)',
+            items,
+        )
+        db.execute(
+            'insert or replace into document (uuid, path, fingerprint)'
+            ' values (?, ?, ?)',
+            (uuid, path, fingerprint),
+        )
+
+def remove_documents(db, uuids):
+    """
+    Remove documents from the search index.
+
+    :param db: Search index database.
+    :param uuids: Collection of document UUIDs.
+    """
+    items = [(u,) for u in uuids]
+    with db:
+        db.executemany('delete from highlight where uuid = ?', items)
+        db.executemany('delete from document where uuid = ?', items)
+
+def search(db, query):
+    """
+    Search highlighted text, PDF page labels and document paths.
+
+    Results are returned by relevance.
+
+    :param db: Search index database.
+    :param query: SQLite full text search query.
+    """
+    try:
+        items = db.execute(SQL_SEARCH, (query,)).fetchall()
+    except sqlite3.OperationalError as ex:
+        raise SearchError('Invalid search query: {}'.format(ex))
+    return [SearchResult(*v) for v in items]
+
+# vim: sw=4:et:ai
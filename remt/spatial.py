@@ -0,0 +1,145 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Spatial index of bounding boxes of strokes of a page.
+
+A page is divided into a grid of cells. A stroke is stored in each cell
+overlapped by its bounding box. Strokes outside of a page are stored in
+the cells at the page border.
+
+Bounding boxes of strokes of the page table are used, so the index is
+built without reading segments of strokes. Any other bounding boxes in
+reMarkable tablet coordinates, i.e. of characters of PDF page text, can
+be indexed as well.
+"""
+
+import math
+import numpy as np
+
+from . import const
+from .data import SpatialIndex
+
+# size of a grid cell in reMarkable tablet pixels
+CELL = 64
+
+def spatial_index(page, cell=CELL):
+    """
+    Create spatial index of bounding boxes of strokes of a page.
+
+    Strokes without bounding box are not indexed.
+
+    :param page: Page table.
+    :param cell: Size of a grid cell.
+    """
+    strokes = page.strokes
+    bbox = np.column_stack([
+        strokes[k].astype(float) for k in ('x1', 'y1', 'x2', 'y2')
+    ]).reshape(-1, 4)
+    return bbox_index(bbox, cell)
+
+def bbox_index(bbox, cell=CELL):
+    """
+    Create spatial index of bounding boxes in reMarkable tablet
+    coordinates.
+
+    Bounding boxes with NaN coordinates are not indexed.
+
+    :param bbox: Array of bounding boxes of shape `(n, 4)`.
+    :param cell: Size of a grid cell.
+    """
+    cols = math.ceil(const.PAGE_WIDTH / cell)
+    rows = math.ceil(const.PAGE_HEIGHT / cell)
+
+    idx = np.flatnonzero(~np.isnan(bbox).any(1))
+    c0, r0, c1, r1 = cell_range(bbox[idx], cell, cols, rows)
+
+    # cells of each stroke
+    w = c1 - c0 + 1
+    n = w * (r1 - r0 + 1)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    w = np.repeat(w, n)
+    cells = (np.repeat(r0, n) + k // w) * cols + np.repeat(c0, n) + k % w
+
+    order = np.argsort(cells, kind='stable')
+    items = np.repeat(idx, n)[order]
+    start = np.searchsorted(cells[order], np.arange(rows * cols + 1))
+    return SpatialIndex(bbox, cell, cols, start, items)
+
+def intersects(index, x1, y1, x2, y2):
+    """
+    Find strokes, which bounding box intersects a rectangle.
+
+    Sorted array of indexes of strokes in stroke table is returned.
+
+    :param index: Spatial index.
+    :param x1: Left coordinate of the rectangle.
+    :param y1: Top coordinate of the rectangle.
+    :param x2: Right coordinate of the rectangle.
+    :param y2: Bottom coordinate of the rectangle.
+    """
+    cols = index.cols
+    rows = (len(index.start) - 1) // cols
+    area = np.array([[x1, y1, x2, y2]], dtype=float)
+    cells = cell_range(area, index.cell, cols, rows)
+    c0, r0, c1, r1 = (v.item() for v in cells)
+
+    # cells of a grid row are stored one after another
+    start, items = index.start, index.items
+    found = [
+        items[start[r * cols + c0]:start[r * cols + c1 + 1]]
+        for r in range(r0, r1 + 1)
+    ]
+    found = np.unique(np.concatenate(found))
+
+    bx1, by1, bx2, by2 = index.bbox[found].T
+    valid = (bx1 <= x2) & (bx2 >= x1) & (by1 <= y2) & (by2 >= y1)
+    return found[valid]
+
+def contains(index, x1, y1, x2, y2):
+    """
+    Find strokes, which bounding box is inside of a rectangle.
+
+    Sorted array of indexes of strokes in stroke table is returned.
+
+    :param index: Spatial index.
+    :param x1: Left coordinate of the rectangle.
+    :param y1: Top coordinate of the rectangle.
+    :param x2: Right coordinate of the rectangle.
+    :param y2: Bottom coordinate of the rectangle.
+    """
+    found = intersects(index, x1, y1, x2, y2)
+    bx1, by1, bx2, by2 = index.bbox[found].T
+    valid = (bx1 >= x1) & (bx2 <= x2) & (by1 >= y1) & (by2 <= y2)
+    return found[valid]
+
+def cell_range(bbox, cell, cols, rows):
+    """
+    Get columns and rows of top left and bottom right grid cells of
+    bounding boxes.
+
+    The cells are clipped to the grid.
+    """
+    to_cell = lambda v, n: np.clip(np.floor_divide(v, cell), 0, n - 1) \
+        .astype(np.intp)
+    x1, y1, x2, y2 = bbox.T
+    return to_cell(x1, cols), to_cell(y1, rows), to_cell(x2, cols), \
+        to_cell(y2, rows)
+
+# vim: sw=4:et:ai
@@ -0,0 +1,70 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmark utilities unit tests.
+"""
+
+import numpy as np
+
+from remt import bench as r_bench
+from remt.parser import parse_table
+
+def test_synth_page():
+    """
+    Test generating reMarkable lines data of a synthetic page.
+    """
+    config = r_bench.SynthConfig(strokes=20, segments=7, pens={2: 1, 5: 3})
+    rng = np.random.default_rng(1)
+    data = r_bench.synth_page(config, rng)
+    page = parse_table(data, 0)
+
+    assert 1 == page.layers
+    assert 20 == len(page.strokes)
+    assert 140 == len(page.segments)
+    assert {2, 5} >= set(page.strokes['pen'].tolist())
+
+def test_synth_document(tmpdir):
+    """
+    Test generating reMarkable lines files of a synthetic document.
+    """
+    config = r_bench.SynthConfig(pages=3, strokes=2, segments=5)
+    files = r_bench.synth_document(config, str(tmpdir))
+    assert 3 == len(files)
+
+    result = r_bench.bench_parse(files)
+    assert 30 == result['segments']
+
+def test_compare():
+    """
+    Test comparing benchmark results with a baseline.
+    """
+    results = {
+        'parse': {'segments_per_s': 150.0},
+        'render': {'time': 1.0},
+    }
+    baseline = {
+        'parse': {'segments_per_s': 100.0},
+        'render': {},
+    }
+    result = list(r_bench.compare(results, baseline))
+    expected = ['parse.segments_per_s: 150 (+50.0%)', 'render.time: 1']
+    assert expected == result
+
+# vim: sw=4:et:ai
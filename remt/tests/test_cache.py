@@ -0,0 +1,241 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Page cache unit tests.
+"""
+
+import asyncio
+import fcntl
+import os
+import os.path
+
+from remt import cache as r_cache
+from remt.data import StrokeFilter
+from remt.parser import parse_table
+
+import numpy as np
+import pytest
+from unittest import mock
+
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', 'overview.rm'
+)
+
+@pytest.fixture
+def page():
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+    return r_cache.page_digest(data), parse_table(data, 0)
+
+def test_cache_file():
+    """
+    Test getting cache file name for a reMarkable lines file.
+    """
+    cache = r_cache.PageCache('/cache', 100)
+    result = r_cache.cache_file(cache, '/data/doc-uuid/page-id.rm')
+    assert '/cache/doc-uuid.page-id.npz' == result
+
+def test_cache_file_select():
+    """
+    Test getting cache file name for a reMarkable lines file parsed with
+    a stroke filter.
+    """
+    cache = r_cache.PageCache('/cache', 100)
+    fin = '/data/doc-uuid/page-id.rm'
+    select = StrokeFilter(pens={5, 3}, bbox=True)
+    result = r_cache.cache_file(cache, fin, select)
+
+    key = r_cache.select_key(select)
+    assert '/cache/doc-uuid.page-id.{}.npz'.format(key) == result
+
+    # order of pens does not matter, but bbox mode does
+    assert key == r_cache.select_key(StrokeFilter(pens={3, 5}, bbox=True))
+    assert key != r_cache.select_key(StrokeFilter(pens={3, 5}))
+
+def test_store_load_page(tmpdir, page):
+    """
+    Test storing page table in the cache and loading it.
+    """
+    digest, expected = page
+    cache = r_cache.PageCache(str(tmpdir), 1024 ** 3)
+
+    r_cache.store_page(cache, '/data/uuid/p1.rm', digest, expected)
+    result = r_cache.load_page(cache, '/data/uuid/p1.rm', digest)
+
+    assert expected.layers == result.layers
+    assert expected.strokes.tolist() == result.strokes.tolist()
+    assert expected.segments.tolist() == result.segments.tolist()
+
+def test_load_page_modified(tmpdir, page):
+    """
+    Test loading page table from the cache when reMarkable lines data
+    was modified.
+    """
+    digest, expected = page
+    cache = r_cache.PageCache(str(tmpdir), 1024 ** 3)
+
+    r_cache.store_page(cache, '/data/uuid/p1.rm', digest, expected)
+    assert r_cache.load_page(cache, '/data/uuid/p1.rm', 'xyz') is None
+    assert r_cache.load_page(cache, '/data/uuid/p2.rm', digest) is None
+
+def test_evict(tmpdir, page):
+    """
+    Test removing least recently used files from the cache.
+    """
+    digest, expected = page
+    cache = r_cache.PageCache(str(tmpdir), 1024 ** 3)
+
+    for p in ('p1', 'p2', 'p3'):
+        r_cache.store_page(cache, '/data/uuid/{}.rm'.format(p), digest, expected)
+
+    fn = lambda p: r_cache.cache_file(cache, '/data/uuid/{}.rm'.format(p))
+    os.utime(fn('p1'), (1000, 1000))
+    os.utime(fn('p2'), (3000, 3000))
+    os.utime(fn('p3'), (2000, 2000))
+
+    # make space for two files only
+    size = os.path.getsize(fn('p1'))
+    r_cache.evict(cache._replace(size=size * 2))
+
+    assert not os.path.exists(fn('p1'))
+    assert os.path.exists(fn('p2'))
+    assert os.path.exists(fn('p3'))
+
+def test_evict_temporary(tmpdir, page):
+    """
+    Test if temporary files written by other processes are not removed
+    from the cache.
+    """
+    digest, expected = page
+    cache = r_cache.PageCache(str(tmpdir), 0)
+
+    fn_new = str(tmpdir.join(r_cache.TMP_PREFIX + 'new'))
+    fn_old = str(tmpdir.join(r_cache.TMP_PREFIX + 'old'))
+    for fn in (fn_new, fn_old):
+        with open(fn, 'wb') as f:
+            f.write(b'data')
+    os.utime(fn_old, (1000, 1000))
+    r_cache.store_page(cache, '/data/uuid/p1.rm', digest, expected)
+
+    r_cache.evict(cache)
+    assert ['.tmp-new'] == os.listdir(str(tmpdir))
+
+def test_store_page_error(tmpdir, page):
+    """
+    Test if temporary file is removed when page table cannot be stored.
+    """
+    digest, expected = page
+    cache = r_cache.PageCache(str(tmpdir), 1024 ** 3)
+
+    with mock.patch.object(np, 'savez', side_effect=OSError('no space')):
+        with pytest.raises(OSError):
+            r_cache.store_page(cache, '/data/uuid/p1.rm', digest, expected)
+
+    assert [] == os.listdir(str(tmpdir))
+
+def test_store_load_manifest(tmpdir):
+    """
+    Test storing manifest of rendered pages and loading it.
+    """
+    path = str(tmpdir.join('doc-uuid'))
+    assert {} == r_cache.load_manifest(path)
+
+    manifest = {'p1': [0, 10, 1000, None, None, False]}
+    r_cache.store_manifest(path, manifest)
+    assert manifest == r_cache.load_manifest(path)
+
+def test_dirty_pages(tmpdir):
+    """
+    Test getting ids of pages, which need to be rendered again.
+    """
+    path = str(tmpdir)
+    for p in ('p1', 'p2'):
+        tmpdir.join(p + '.pdf').write('')
+
+    manifest = {'p1': [0, 1], 'p2': [1, 1], 'p3': [2, 1]}
+    fingerprints = {'p1': [0, 1], 'p2': [1, 2], 'p3': [2, 1], 'p4': [3, 1]}
+
+    # p2 changed, no PDF file for p3, p4 is new page
+    result = r_cache.dirty_pages(path, manifest, fingerprints)
+    assert ['p2', 'p3', 'p4'] == result
+
+def test_remove_pages(tmpdir):
+    """
+    Test removing PDF files of rendered pages.
+    """
+    for p in ('p1', 'p2', 'p3'):
+        tmpdir.join(p + '.pdf').write('')
+    tmpdir.join('manifest.json').write('')
+
+    r_cache.remove_pages(str(tmpdir), ['p1', 'p3'])
+    result = sorted(os.listdir(str(tmpdir)))
+    assert ['manifest.json', 'p1.pdf', 'p3.pdf'] == result
+
+def test_evict_dirs(tmpdir):
+    """
+    Test removing least recently used directories from the cache.
+    """
+    cache = r_cache.PageCache(str(tmpdir), 1024 ** 3)
+    tmpdir.join('.lock').write('')
+    for d, t in (('d1', 1000), ('d2', 3000), ('d3', 2000)):
+        tmpdir.mkdir(d).join('p1.pdf').write('x' * 10)
+        os.utime(str(tmpdir.join(d)), (t, t))
+
+    # make space for two directories only
+    r_cache.evict_dirs(cache._replace(size=20))
+    assert ['.lock', 'd2', 'd3'] == sorted(os.listdir(str(tmpdir)))
+
+@pytest.mark.asyncio
+async def test_cache_lock(tmpdir):
+    """
+    Test if cache directory is locked for exclusive use.
+    """
+    path = str(tmpdir.join('meta'))
+    async with r_cache.cache_lock(path):
+        with open(os.path.join(path, '.lock')) as f:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    with open(os.path.join(path, '.lock')) as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+@pytest.mark.asyncio
+async def test_cache_lock_wait(tmpdir):
+    """
+    Test waiting for lock of cache directory locked by another process.
+    """
+    path = str(tmpdir.join('meta'))
+    os.makedirs(path)
+    f = open(os.path.join(path, '.lock'), 'w')
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+    async def unlock():
+        await asyncio.sleep(0.05)
+        f.close()
+
+    task = asyncio.ensure_future(unlock())
+    with mock.patch.object(r_cache, 'logger') as logger:
+        async with r_cache.cache_lock(path, delay=0.01):
+            assert f.closed
+
+    await task
+    assert 1 == logger.warning.call_count
+
+# vim: sw=4:et:ai
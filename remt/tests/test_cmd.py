@@ -21,10 +21,15 @@
 Command line commands unit tests.
 """
 
+import asyncssh
+import configparser
+import json
 import os.path
+import shutil
 from datetime import datetime
 
 from remt import cmd as r_cmd
+from remt.data import Page, PageEnd
 from remt.error import *
 
 import asynctest
@@ -141,16 +146,314 @@ def test_fn_metadata_error():
     with pytest.raises(FileError):
         r_cmd.fn_metadata(meta, 'x/y')
 
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', '{}.rm'
+)
+
+@pytest.fixture
+def document(tmpdir):
+    """
+    Create document from the example reMarkable lines files.
+    """
+    pages = ['brush', 'p-missing', 'overview', 'tilt-pencil']
+    dir_doc = tmpdir.mkdir('doc-uuid')
+    for p in pages:
+        fn = FN_EXAMPLE.format(p)
+        if os.path.exists(fn):
+            shutil.copy(fn, str(dir_doc.join(p + '.rm')))
+
+    ctx = mock.MagicMock()
+    ctx.dir_data = str(tmpdir)
+    data = {'uuid': 'doc-uuid', 'content': {'pages': pages}}
+    return ctx, data
+
+def test_parse_document(document):
+    """
+    Test parsing pages of a document.
+    """
+    ctx, data = document
+    items = list(r_cmd.parse_document(ctx, data))
+    pages = [v for v in items if isinstance(v, (Page, PageEnd))]
+
+    # empty page for missing reMarkable lines file
+    expected = [
+        Page(0), PageEnd(0), Page(1), PageEnd(1),
+        Page(2), PageEnd(2), Page(3), PageEnd(3),
+    ]
+    assert expected == pages
+    assert 4 < len(items)
+
+def test_parse_document_jobs(document):
+    """
+    Test parsing pages of a document with a pool of processes.
+    """
+    ctx, data = document
+    expected = list(r_cmd.parse_document(ctx, data))
+    result = list(r_cmd.parse_document(ctx, data, jobs=2))
+    assert expected == result
+
+def test_parse_document_cache(document, tmpdir):
+    """
+    Test parsing pages of a document with page cache.
+    """
+    ctx, data = document
+    cache = r_cmd.PageCache(str(tmpdir.join('cache')), 1024 ** 3)
+    expected = list(r_cmd.parse_document(ctx, data))
+
+    # store and load pages
+    assert expected == list(r_cmd.parse_document(ctx, data, cache=cache))
+    assert 3 == len(os.listdir(cache.path))
+    assert expected == list(r_cmd.parse_document(ctx, data, cache=cache))
+
+def test_read_document_cache_select(document, tmpdir):
+    """
+    Test if pages parsed with a stroke filter are cached separately.
+    """
+    ctx, data = document
+    cache = r_cmd.PageCache(str(tmpdir.join('cache')), 1024 ** 3)
+    select = r_cmd.StrokeFilter(pens={5}, bbox=True)
+    expected = list(r_cmd.read_document(ctx, data, select))
+
+    # store and load pages parsed with the stroke filter only
+    parse_table = r_cmd.remt.parse_table
+    with mock.patch.object(r_cmd.remt, 'parse_table', wraps=parse_table) \
+            as parse_table:
+        result = list(r_cmd.read_document(ctx, data, select, cache=cache))
+        assert 3 == parse_table.call_count
+        assert all(c[0][2] == select for c in parse_table.call_args_list)
+    assert 3 == len(os.listdir(cache.path))
+
+    result = list(r_cmd.read_document(ctx, data, select, cache=cache))
+    assert 3 == len(os.listdir(cache.path))
+    for p1, p2 in zip(expected, result):
+        assert p1.number == p2.number
+        assert p1.strokes.tolist() == p2.strokes.tolist()
+        assert not len(p2.segments)
+
+    # all strokes are parsed when no stroke filter is used
+    list(r_cmd.read_document(ctx, data, cache=cache))
+    assert 6 == len(os.listdir(cache.path))
+
+def test_read_document_evict(document, tmpdir):
+    """
+    Test if files are removed from page cache once, when pages of
+    a document are read.
+    """
+    ctx, data = document
+    cache = r_cmd.PageCache(str(tmpdir.join('cache')), 1024 ** 3)
+    with mock.patch.object(r_cmd, 'evict') as evict:
+        pages = r_cmd.read_document(ctx, data, cache=cache)
+        assert 4 == len(list(pages))
+    evict.assert_called_once_with(cache)
+
+def test_index_document(document):
+    """
+    Test getting text highlighted on pages of a document.
+    """
+    ctx, data = document
+    pdf_doc = mock.MagicMock()
+    pdf_page = pdf_doc.get_page.return_value
+    pdf_page.get_label.return_value = 'i'
+    pdf_page.get_index.return_value = 2
+
+    with mock.patch.object(r_cmd, '_index_pdf') as index_pdf, \
+            mock.patch.object(r_cmd, 'pdf_texts') as pdf_texts:
+        index_pdf.return_value = pdf_doc
+        pdf_texts.side_effect = lambda p, idx: [str(len(idx.bbox))]
+        result = list(r_cmd.index_document(ctx, data, 'a.pdf'))
+
+    # only overview page has highlighter strokes
+    assert [('i', 2, ['7'])] == result
+    pages = [c[0][0] for c in pdf_doc.get_page.call_args_list]
+    assert [2] == pages
+
+def test_index_document_no_highlights(document):
+    """
+    Test if PDF pages are not read for pages without highlighter strokes.
+    """
+    ctx, data = document
+    data['content']['pages'] = ['brush', 'p-missing', 'tilt-pencil']
+
+    with mock.patch.object(r_cmd, '_index_pdf') as index_pdf:
+        result = list(r_cmd.index_document(ctx, data, 'a.pdf'))
+
+    assert [] == result
+    assert not index_pdf.called
+
+class SFTPFile:
+    """
+    Asynchronous SFTP file mock reading a local file.
+    """
+    def __init__(self, fn, events):
+        self.fn = fn
+        self.events = events
+        self.file = None
+
+    async def __aenter__(self):
+        if not os.path.exists(self.fn):
+            raise asyncssh.SFTPNoSuchFile('No such file')
+        self.file = open(self.fn, 'rb')
+        self.events.append(('read', os.path.basename(self.fn)))
+        return self
+
+    async def __aexit__(self, *args):
+        self.file.close()
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+@pytest.mark.asyncio
+async def test_read_document_stream(document):
+    """
+    Test reading page tables of a document from a reMarkable tablet,
+    while files of next pages are fetched.
+    """
+    ctx, data = document
+    events = []
+    dir_doc = os.path.join(ctx.dir_data, data['uuid'])
+    ctx.sftp.open = lambda fn, mode: SFTPFile(
+        os.path.join(dir_doc, os.path.basename(fn)), events
+    )
+
+    result = []
+    async for page in r_cmd.read_document_stream(ctx, data, prefetch=2):
+        events.append(('page', page.number))
+        result.append(page)
+
+    expected = list(r_cmd.read_document(ctx, data))
+    assert [p.number for p in expected] == [p.number for p in result]
+    assert [p.layers for p in expected] == [p.layers for p in result]
+    for p1, p2 in zip(expected, result):
+        assert p1.strokes.tolist() == p2.strokes.tolist()
+        assert p1.segments.tolist() == p2.segments.tolist()
+
+    # files of next pages are read before first page is processed
+    assert ('read', 'overview.rm') == events[1]
+    assert ('page', 0) == events[2]
+
+def test_render_cache():
+    """
+    Test creating cache of rendered pages.
+    """
+    config = configparser.ConfigParser()
+    config.read_string('[cache]\npath=/cache\nrender_size=2\n')
+    result = r_cmd.render_cache(config)
+    assert ('/cache/render', 2 * 1024 ** 2) == result
+
+    config.read_string('[cache]\nenabled=false\n')
+    assert r_cmd.render_cache(config) is None
+
+@pytest.mark.asyncio
+async def test_export_remt_incremental_no_cache():
+    """
+    Test if all pages are rendered without storing them, when the cache
+    is disabled.
+    """
+    ctx = mock.MagicMock()
+    ctx.config = configparser.ConfigParser()
+    ctx.config.read_string('[cache]\nenabled=false\n')
+    data = {'uuid': 'doc-uuid'}
+
+    with mock.patch.object(r_cmd, '_export_remt', asynctest.CoroutineMock()):
+        await r_cmd._export_remt_incremental(
+            ctx, data, 'out.pdf', jobs=2, tolerance=None, curve=False
+        )
+        r_cmd._export_remt.assert_called_once_with(
+            ctx, data, 'out.pdf', jobs=2, tolerance=None, curve=False
+        )
+    assert not ctx.sftp.readdir.called
+
+def test_page_fingerprints():
+    """
+    Test creating fingerprints of pages of a document.
+    """
+    attrs = {
+        'p1.rm': mock.Mock(size=10, mtime=100),
+        'p2.rm': mock.Mock(size=20, mtime=200),
+    }
+    pdf_attrs = mock.Mock(size=30, mtime=300)
+    draw_args = {'tolerance': 0.5, 'curve': True}
+
+    result = r_cmd.page_fingerprints(['p1', 'p3'], attrs, pdf_attrs, draw_args)
+    expected = {
+        'p1': [0, 10, 100, 30, 300, True, 0.5],
+        'p3': [1, None, None, 30, 300, True, 0.5],
+    }
+    assert expected == result
+
+def test_document_fingerprint():
+    """
+    Test creating fingerprint of a document.
+    """
+    attrs = {
+        'p2.rm': mock.Mock(size=20, mtime=200),
+        'p1.rm': mock.Mock(size=10, mtime=100),
+        'p1-metadata.json': mock.Mock(size=5, mtime=50),
+    }
+    data = {'lastModified': '1000'}
+
+    result = r_cmd.document_fingerprint(data, attrs)
+    expected = '["1000", [["p1.rm", 10, 100], ["p2.rm", 20, 200]]]'
+    assert expected == result
+
+def test_prepare_import_data(tmpdir):
+    """
+    Test preparing import data of a PDF file.
+    """
+    fn_in = str(tmpdir.join('doc.pdf'))
+    with open(fn_in, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+
+    dir_data = tmpdir.mkdir('data')
+    ctx = mock.MagicMock()
+    ctx.dir_data = str(dir_data)
+
+    result = r_cmd._prepare_import_data(ctx, 'dir-uuid', fn_in, 5)
+    fn_base = result[:-2]
+
+    # the file is linked, not copied
+    assert fn_in == os.readlink(fn_base + '.pdf')
+    with open(fn_base + '.content') as f:
+        assert 5 == json.load(f)['pageCount']
+    with open(fn_base + '.metadata') as f:
+        data = json.load(f)
+    assert 'doc.pdf' == data['visibleName']
+    assert 'dir-uuid' == data['parent']
+
+@mock.patch.object(r_cmd, 'pdf_page_count')
+def test_import_page_counts(mock_count, tmpdir):
+    """
+    Test getting number of pages of files to be imported.
+    """
+    files = [str(tmpdir.join('{}.pdf'.format(i))) for i in range(3)]
+    for fn in files:
+        with open(fn, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+    mock_count.side_effect = [3, 1, 2]
+
+    assert [3, 1, 2] == r_cmd.import_page_counts(files)
+    assert [mock.call(fn) for fn in files] == mock_count.call_args_list
+
+def test_import_page_counts_error(tmpdir):
+    """
+    Test if OS error is raised for missing or unreadable file to be
+    imported.
+    """
+    for fn in (tmpdir.join('missing.pdf'), tmpdir.mkdir('dir.pdf')):
+        with pytest.raises(OSError) as ex:
+            r_cmd.import_page_counts([str(fn)], jobs=2)
+        assert str(fn) in str(ex.value)
+
 @pytest.mark.asyncio
 async def test_read_meta():
     """
     Test reading metadata.
     """
     sftp = mock.MagicMock()
-    sftp.mget = asynctest.CoroutineMock()
     dir_meta = 'dir'
 
-    with mock.patch('glob.glob') as mock_glob, \
+    with mock.patch.object(r_cmd, 'sync_meta', asynctest.CoroutineMock()), \
+            mock.patch('glob.glob') as mock_glob, \
             mock.patch('json.load') as mock_json_load, \
             mock.patch('builtins.open') as mock_open:
 
@@ -178,5 +481,82 @@ async def test_read_meta():
         assert {'pages': 3} == result['f1']['content']
         assert {'pages': 4} == result['f2']['content']
         assert {'pages': 5} == result['f3']['content']
+        r_cmd.sync_meta.assert_called_once_with(sftp, dir_meta, False)
+
+def sftp_device(files):
+    """
+    Create SFTP connection mock serving files of a reMarkable tablet.
+
+    :param files: Dictionary of file name and tuple of file data and
+        modification time.
+    """
+    def mget(paths, path):
+        for fn in paths:
+            data = files[os.path.basename(fn)][0]
+            with open(os.path.join(path, os.path.basename(fn)), 'w') as f:
+                f.write(data)
+
+    entry = lambda fn, data, mtime: mock.Mock(
+        filename=fn, attrs=mock.Mock(size=len(data), mtime=mtime)
+    )
+    sftp = mock.MagicMock()
+    sftp.readdir = asynctest.CoroutineMock(return_value=[
+        entry(fn, *v) for fn, v in files.items()
+    ])
+    sftp.mget = asynctest.CoroutineMock(side_effect=mget)
+    return sftp
+
+def fetched_files(sftp):
+    """
+    Get names of files fetched with SFTP connection mock.
+    """
+    return sorted(
+        os.path.basename(fn)
+        for args, _ in sftp.mget.call_args_list for fn in args[0]
+    )
+
+@pytest.mark.asyncio
+async def test_sync_meta(tmpdir):
+    """
+    Test synchronizing metadata files with a directory.
+    """
+    dir_meta = str(tmpdir)
+    files = {
+        'u1.metadata': ('m1', 1),
+        'u1.content': ('c1', 1),
+        'u2.metadata': ('m2', 1),
+        'u2.content': ('c2', 1),
+        'u1': ('', 1),
+    }
+    await r_cmd.sync_meta(sftp_device(files), dir_meta)
+
+    # changed, removed and new files
+    files['u1.metadata'] = ('m1-new', 2)
+    del files['u2.metadata'], files['u2.content']
+    files['u3.metadata'] = ('m3', 3)
+    sftp = sftp_device(files)
+    await r_cmd.sync_meta(sftp, dir_meta)
+
+    assert ['u1.metadata', 'u3.metadata'] == fetched_files(sftp)
+    result = sorted(fn for fn in os.listdir(dir_meta) if fn[0] == 'u')
+    assert ['u1.content', 'u1.metadata', 'u3.metadata'] == result
+    with open(os.path.join(dir_meta, 'u1.metadata')) as f:
+        assert 'm1-new' == f.read()
+
+@pytest.mark.asyncio
+async def test_sync_meta_refresh(tmpdir):
+    """
+    Test synchronizing all metadata files with a directory.
+    """
+    dir_meta = str(tmpdir)
+    files = {'u1.metadata': ('m1', 1), 'u1.content': ('c1', 1)}
+    await r_cmd.sync_meta(sftp_device(files), dir_meta)
+
+    sftp = sftp_device(files)
+    await r_cmd.sync_meta(sftp, dir_meta)
+    assert [] == fetched_files(sftp)
+
+    await r_cmd.sync_meta(sftp, dir_meta, refresh=True)
+    assert ['u1.content', 'u1.metadata'] == fetched_files(sftp)
 
 # vim: sw=4:et:ai
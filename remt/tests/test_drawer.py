@@ -0,0 +1,236 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Drawer unit tests.
+"""
+
+import itertools
+import numpy as np
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+
+from remt import drawer
+from remt.erase import cull_erased
+from remt.data import Context, Layer, Stroke, Segment
+from remt.parser import empty_table, parse_table, page_items
+
+from unittest import mock
+
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', 'overview.rm'
+)
+FN_ERASE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools',
+    'erase-area.rm'
+)
+
+def create_stroke(pen, color=0, width=2):
+    segments = [
+        Segment(0, 0, 0, 0, 0, 0, 0),
+        Segment(1, 1, 1, 0, 0, 0, 0),
+    ]
+    return Stroke(0, pen, color, width, segments)
+
+def create_context(batch):
+    cr = mock.MagicMock()
+    return Context(None, cr, None, itertools.count(), batch=batch)
+
+def test_draw_multi_line():
+    """
+    Test drawing lines of the same width as one path.
+    """
+    cr = mock.MagicMock()
+    draw_stroke = mock.MagicMock()
+    lines = [
+        (1, np.array([[0, 0], [1, 1]])),
+        (2, np.array([[2, 2], [3, 3]])),
+        (1, np.array([[4, 4], [5, 5]])),
+    ]
+    drawer.draw_multi_line(cr, draw_stroke, lines)
+
+    assert 2 == draw_stroke.call_count
+    cr.set_line_width.assert_has_calls([mock.call(1), mock.call(2)])
+    cr.move_to.assert_has_calls([
+        mock.call(0, 0), mock.call(4, 4), mock.call(2, 2),
+    ])
+
+def test_draw_batch():
+    """
+    Test drawing strokes of the same style, color and width as one path.
+    """
+    context = create_context([])
+    strokes = [
+        create_stroke(4), create_stroke(4), create_stroke(4, width=3),
+        create_stroke(4, width=3),
+    ]
+    for s in strokes:
+        drawer.draw(s, context)
+
+    # last strokes are still in the batch
+    assert 1 == context.cr_ctx.save.call_count
+    assert 2 == len(context.batch)
+
+    drawer.draw(Layer(1), context)
+    assert 2 == context.cr_ctx.save.call_count
+    assert 2 == context.cr_ctx.stroke.call_count
+    assert [] == context.batch
+
+def test_draw_no_batch():
+    """
+    Test drawing translucent strokes separately.
+    """
+    context = create_context([])
+    for s in [create_stroke(5), create_stroke(5)]:
+        drawer.draw(s, context)
+
+    assert 2 == context.cr_ctx.save.call_count
+    assert [] == context.batch
+
+def test_draw_page():
+    """
+    Test drawing page table with single call.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        page = parse_table(f.read(), 0)
+
+    expected = create_context([])
+    for item in page_items(page):
+        drawer.draw(item, expected)
+
+    context = create_context([])
+    drawer.draw_page(page, context)
+
+    assert 0 < len(context.cr_ctx.mock_calls)
+    assert expected.cr_ctx.mock_calls == context.cr_ctx.mock_calls
+
+def test_draw_page_erased():
+    """
+    Test if drawing page table with single call and drawing items of the
+    page produce the same output for a page with eraser strokes.
+    """
+    with open(FN_ERASE, 'rb') as f:
+        page = parse_table(f.read(), 0)
+
+    expected = create_context([])
+    for item in page_items(page):
+        drawer.draw(item, expected)
+
+    context = create_context([])
+    drawer.draw_page(page, context)
+
+    # strokes hidden by the erase area strokes are not drawn
+    strokes = [v for v in page_items(page) if isinstance(v, Stroke)]
+    assert len(cull_erased(page).strokes) == len(strokes)
+    assert len(page.strokes) != len(strokes)
+    assert expected.cr_ctx.mock_calls == context.cr_ctx.mock_calls
+
+def test_draw_page_area():
+    """
+    Test drawing strokes of a page intersecting an area.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        page = parse_table(f.read(), 0)
+
+    context = create_context([])
+    drawer.draw_page(page, context, area=(0, 0, 1404, 1872))
+    n = context.cr_ctx.stroke.call_count
+
+    context = create_context([])
+    drawer.draw_page(page, context, area=(0, 0, 500, 500))
+    assert 0 < context.cr_ctx.stroke.call_count < n
+
+def test_draw_overlay_no_strokes(tmpdir):
+    """
+    Test if PDF file is copied when there are no strokes to draw.
+    """
+    fn_pdf = tmpdir.join('in.pdf')
+    fn_pdf.write_binary(b'%PDF-1.4')
+    fn_out = tmpdir.join('out.pdf')
+
+    pages = [empty_table(0), empty_table(1)]
+    with mock.patch.object(drawer, 'pdf_overlay') as pdf_overlay:
+        drawer.draw_overlay(pages, str(fn_pdf), str(fn_out))
+
+    assert b'%PDF-1.4' == fn_out.read_binary()
+    assert not pdf_overlay.called
+
+def test_split_pages():
+    """
+    Test splitting pages into slices of consecutive pages.
+    """
+    result = drawer.split_pages(list(range(8)), 3)
+    assert [[0, 1, 2], [3, 4, 5], [6, 7]] == result
+
+def test_draw_parallel_single():
+    """
+    Test rendering single page into PDF file without pool of processes.
+    """
+    pages = [empty_table(0)]
+    with mock.patch.object(drawer, 'draw_pdf') as draw_pdf, \
+            mock.patch.object(drawer, 'pdf_merge') as pdf_merge:
+        drawer.draw_parallel(pages, None, 'a.pdf', 4)
+
+    draw_pdf.assert_called_once_with(pages, None, 'a.pdf', None, False)
+    assert not pdf_merge.called
+
+def test_load_brush():
+    """
+    Test if brush patterns are created for each thread.
+    """
+    brush = drawer.load_brush('pencil.png')
+    assert brush is drawer.load_brush('pencil.png')
+
+    with ThreadPoolExecutor(1) as executor:
+        other = executor.submit(drawer.load_brush, 'pencil.png').result()
+    assert other is not brush
+
+def test_raster_fn():
+    """
+    Test creating PNG file name for a page.
+    """
+    assert 'a/b-001.png' == drawer.raster_fn('a/b.png', 1)
+    assert 'a/b-012.png' == drawer.raster_fn('a/b', 12)
+
+def test_draw_raster():
+    """
+    Test rendering pages into PNG files with a pool of threads.
+    """
+    pages = [empty_table(i) for i in range(5)]
+    with mock.patch.object(drawer, 'draw_png') as draw_png:
+        result = drawer.draw_raster(pages, None, 'a.png', 100, jobs=3)
+
+    expected = ['a-{:03d}.png'.format(i) for i in range(5)]
+    assert expected == result
+    assert 5 == draw_png.call_count
+    draw_png.assert_any_call(pages[3], None, 'a-003.png', 100, None, False)
+
+def test_draw_raster_single():
+    """
+    Test if output file name is kept when rendering single page into PNG
+    file.
+    """
+    pages = [empty_table(0)]
+    with mock.patch.object(drawer, 'draw_png') as draw_png:
+        result = drawer.draw_raster(iter(pages), None, 'a.png', 100)
+
+    assert ['a.png'] == result
+    draw_png.assert_called_once_with(pages[0], None, 'a.png', 100, None, False)
+
+# vim: sw=4:et:ai
@@ -0,0 +1,120 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Culling of strokes hidden by eraser strokes unit tests.
+"""
+
+import numpy as np
+
+from remt.data import PageTable, DTYPE_STROKE, DTYPE_SEGMENT
+from remt.erase import cull_erased
+
+# horizontal line and erase area covering its middle part
+LINE = [(x, 100) for x in range(100, 304, 4)]
+AREA = [(150, 50), (250, 50), (250, 150), (150, 150)]
+
+def create_page(*strokes):
+    """
+    Create page table from list of tuples of pen and points of a stroke.
+    """
+    table = np.zeros(len(strokes), dtype=DTYPE_STROKE)
+    table['width'] = 2
+    table[['x1', 'y1', 'x2', 'y2']] = (np.nan,) * 4
+    segments = np.zeros(sum(len(p) for _, p in strokes), dtype=DTYPE_SEGMENT)
+
+    offset = 0
+    for i, (pen, points) in enumerate(strokes):
+        n = len(points)
+        table[i]['number'] = i
+        table[i]['pen'] = pen
+        table[i]['offset'] = offset
+        table[i]['count'] = n
+        segments['x'][offset:offset + n] = [x for x, _ in points]
+        segments['y'][offset:offset + n] = [y for _, y in points]
+        offset += n
+    return PageTable(0, 1, table, segments)
+
+def stroke_points(page, k):
+    o, c = page.strokes['offset'][k], page.strokes['count'][k]
+    return page.segments[['x', 'y']][o:o + c].tolist()
+
+def test_cull_no_eraser():
+    """
+    Test culling strokes of a page without eraser strokes.
+    """
+    page = create_page((4, LINE))
+    assert page is cull_erased(page)
+
+def test_cull_split():
+    """
+    Test splitting a stroke partially hidden by erase area.
+    """
+    page = create_page((4, LINE), (8, AREA))
+    result = cull_erased(page)
+
+    assert [4, 4, 8] == result.strokes['pen'].tolist()
+    assert [0, 0, 1] == result.strokes['number'].tolist()
+
+    # beginning and end of the line are visible
+    first, last = stroke_points(result, 0), stroke_points(result, 1)
+    assert (100, 100) == first[0]
+    assert 150 < first[-1][0] < 200
+    assert 200 < last[0][0] < 250
+    assert (300, 100) == last[-1]
+    assert AREA == stroke_points(result, 2)
+
+    # segments of the page are not copied
+    assert page.segments is result.segments
+
+def test_cull_hidden():
+    """
+    Test removing a stroke hidden by erase area.
+    """
+    line = [(x, 100) for x in range(180, 224, 4)]
+    page = create_page((4, line), (8, AREA))
+    result = cull_erased(page)
+
+    # eraser is not needed as there is no visible stroke below it
+    assert 0 == len(result.strokes)
+
+def test_cull_stroke_over_eraser():
+    """
+    Test keeping a stroke drawn over erase area.
+    """
+    page = create_page((8, AREA), (4, LINE))
+    result = cull_erased(page)
+
+    # eraser is not needed as there is no stroke below it
+    assert [4] == result.strokes['pen'].tolist()
+    assert LINE == stroke_points(result, 0)
+
+def test_cull_eraser():
+    """
+    Test removing a stroke hidden by eraser line.
+    """
+    line = [(x, 100) for x in range(180, 224, 4)]
+    eraser = [(x, 100) for x in range(150, 254, 4)]
+    page = create_page((4, line), (6, eraser))
+    page.strokes['width'][1] = 2.125
+    result = cull_erased(page)
+
+    assert 0 == len(result.strokes)
+
+# vim: sw=4:et:ai
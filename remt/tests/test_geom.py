@@ -0,0 +1,68 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Line geometry unit tests.
+"""
+
+import numpy as np
+
+from remt import geom
+
+def test_simplify():
+    """
+    Test line simplification.
+    """
+    points = np.array([
+        [0, 0], [1, 0.1], [2, -0.1], [3, 5], [4, 6], [5, 7], [6, 8.1],
+    ])
+    result = geom.simplify(points, 0.5)
+    expected = [[0, 0], [2, -0.1], [3, 5], [6, 8.1]]
+    assert expected == result.tolist()
+
+def test_simplify_short():
+    """
+    Test simplification of a line with two points.
+    """
+    points = np.array([[0, 0], [1, 1]])
+    result = geom.simplify(points, 0.5)
+    assert [[0, 0], [1, 1]] == result.tolist()
+
+def test_simplify_closed():
+    """
+    Test simplification of a closed line.
+    """
+    points = np.array([[0, 0], [4, 0], [4, 4], [0, 0]])
+    result = geom.simplify(points, 0.5)
+    assert [[0, 0], [4, 0], [4, 4], [0, 0]] == result.tolist()
+
+def test_to_curves():
+    """
+    Test converting line into cubic Bézier curves.
+    """
+    points = np.array([[0, 0], [6, 0], [12, 0]])
+    result = geom.to_curves(points)
+
+    assert (2, 3, 2) == result.shape
+    # curves pass through the points of the line
+    assert [[6, 0], [12, 0]] == result[:, 2].tolist()
+    assert [[1, 0], [4, 0]] == result[0, :2].tolist()
+    assert [[8, 0], [11, 0]] == result[1, :2].tolist()
+
+# vim: sw=4:et:ai
@@ -22,7 +22,15 @@ reMarkable table lines parser unit tests.
 """
 
 import io
+import os.path
+import pytest
 import remt.parser as r_parser
+from remt.data import Page, PageEnd, Layer, Stroke, Segment, SegmentView, \
+    StrokeFilter
+
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', 'overview.rm'
+)
 
 def test_parse_item():
     """
@@ -37,4 +45,260 @@ def test_parse_item():
     remaining = data.read()
     assert b'\x00\xff' == remaining
 
+def test_parse_item_buffer():
+    """
+    Test parsing of a drawing item with buffer reader.
+    """
+    data = r_parser.BufferReader(b'\x01\x02\x03\x04\x00\xff')
+    result = r_parser.parse_item(r_parser.FMT_LAYER, data)
+    assert (0x04030201,) == result
+    assert 4 == data.offset
+
+    # still possible to read the rest of the data
+    remaining = data.read(2)
+    assert b'\x00\xff' == remaining
+
+def test_parse_array():
+    """
+    Test parsing reMarkable lines data with segments decoded into NumPy
+    array.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        expected = list(r_parser.parse(f, 0))
+    with open(FN_EXAMPLE, 'rb') as f:
+        result = list(r_parser.parse(f, 0, array=True))
+
+    assert len(expected) == len(result)
+    strokes = [
+        (s1, s2) for s1, s2 in zip(expected, result)
+        if isinstance(s1, Stroke)
+    ]
+    assert strokes
+    for s1, s2 in strokes:
+        assert s1[:4] == s2[:4]
+        assert s1.segments.array.tolist() == s2.segments.tolist()
+
+def test_parse_buffer():
+    """
+    Test parsing reMarkable lines data from a buffer.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        expected = list(r_parser.parse(f, 0))
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    assert expected == list(r_parser.parse(data, 0))
+    assert expected == list(r_parser.parse(memoryview(data), 0))
+
+def test_parse_table():
+    """
+    Test parsing reMarkable lines data into page table.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        expected = [v for v in r_parser.parse(f, 0) if isinstance(v, Stroke)]
+    with open(FN_EXAMPLE, 'rb') as f:
+        page = r_parser.parse_table(f, 3)
+
+    assert 3 == page.number
+    assert len(expected) == len(page.strokes)
+    assert sum(len(s.segments) for s in expected) == len(page.segments)
+
+    offsets = page.strokes['offset'].tolist()
+    counts = page.strokes['count'].tolist()
+    assert 0 == offsets[0]
+    assert [o + c for o, c in zip(offsets, counts)][:-1] == offsets[1:]
+
+def test_page_items():
+    """
+    Test converting page table into drawing items.
+    """
+    data = r_parser.HEADER_START \
+        + r_parser.FMT_PAGE.pack(2, 0, 0) \
+        + r_parser.FMT_LAYER.pack(0) \
+        + r_parser.FMT_LAYER.pack(1) \
+        + r_parser.FMT_STROKE.pack(2, 1, 0, 1.5, 2) \
+        + r_parser.FMT_SEGMENT.pack(1, 2, 3, 4, 5, 6) \
+        + r_parser.FMT_SEGMENT.pack(7, 8, 9, 10, 11, 12)
+    page = r_parser.parse_table(data, 1)
+    p, l1, l2, stroke, pe = r_parser.page_items(page)
+
+    # empty layer is preserved
+    assert Page(1) == p
+    assert Layer(0) == l1
+    assert Layer(1) == l2
+    assert PageEnd(1) == pe
+
+    assert (0, 2, 1, 1.5) == stroke[:4]
+    assert isinstance(stroke.segments, SegmentView)
+    assert 2 == len(stroke.segments)
+    assert Segment(1, 7, 8, 9, 10, 11, 12) == stroke.segments[-1]
+    assert [Segment(0, 1, 2, 3, 4, 5, 6)] == list(stroke.segments[:1])
+
+def test_parse_filter_pens():
+    """
+    Test parsing reMarkable lines data with strokes filtered by pen.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    is_stroke = lambda v: isinstance(v, Stroke)
+    strokes = [v for v in r_parser.parse(data, 0) if is_stroke(v)]
+    pen = strokes[0].pen
+    expected = [s for s in strokes if s.pen == pen]
+    assert len(expected) < len(strokes)
+
+    select = StrokeFilter(pens={pen})
+    result = [v for v in r_parser.parse(data, 0, select=select) if is_stroke(v)]
+    assert expected == result
+
+def test_parse_filter_layers():
+    """
+    Test parsing reMarkable lines data with strokes filtered by layer.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    select = StrokeFilter(layers={1})
+    page = r_parser.parse_table(data, 0, select)
+    assert 0 < page.layers
+    assert 0 == len(page.strokes)
+    assert 0 == len(page.segments)
+
+def test_parse_filter_bbox():
+    """
+    Test parsing reMarkable lines data with bounding box of strokes only.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    is_stroke = lambda v: isinstance(v, Stroke)
+    expected = [v for v in r_parser.parse(data, 0) if is_stroke(v)]
+
+    select = StrokeFilter(bbox=True)
+    result = [v for v in r_parser.parse(data, 0, select=select) if is_stroke(v)]
+
+    assert len(expected) == len(result)
+    for s1, s2 in zip(expected, result):
+        assert 0 == len(s2.segments)
+        assert s1.bbox == s2.bbox
+
+        x = [s.x for s in s1.segments]
+        y = [s.y for s in s1.segments]
+        assert (min(x), min(y), max(x), max(y)) == s2.bbox
+
+def test_filter_table():
+    """
+    Test filtering strokes of page table.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    page = r_parser.parse_table(data, 0)
+    for select in (StrokeFilter(pens={2, 5}), StrokeFilter(pens={5}, bbox=True)):
+        expected = r_parser.parse_table(data, 0, select)
+        result = r_parser.filter_table(page, select)
+        assert expected.strokes.tolist() == result.strokes.tolist()
+        assert expected.segments.tolist() == result.segments.tolist()
+
+class Stream:
+    """
+    Asynchronous byte stream returning data in small chunks.
+    """
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    async def read(self, size):
+        return self.data.read(min(size, 1000))
+
+@pytest.mark.asyncio
+async def test_parse_async():
+    """
+    Test parsing reMarkable lines data from asynchronous byte stream.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    expected = list(r_parser.parse(data, 1))
+    result = [v async for v in r_parser.parse_async(Stream(data), 1)]
+    assert expected == result
+
+@pytest.mark.asyncio
+async def test_parse_async_filter():
+    """
+    Test parsing reMarkable lines data from asynchronous byte stream with
+    stroke filter.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    select = StrokeFilter(pens={5}, bbox=True)
+    expected = list(r_parser.parse(data, 1, select=select))
+    stream = r_parser.parse_async(Stream(data), 1, select)
+    result = [v async for v in stream]
+    assert expected == result
+
+@pytest.mark.asyncio
+async def test_parse_table_async():
+    """
+    Test parsing reMarkable lines data from asynchronous byte stream into
+    page table.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    for select in (None, StrokeFilter(pens={5}, bbox=True)):
+        expected = r_parser.parse_table(data, 1, select)
+        result = await r_parser.parse_table_async(Stream(data), 1, select)
+
+        assert 1 == result.number
+        assert expected.layers == result.layers
+        assert expected.strokes.tolist() == result.strokes.tolist()
+        assert expected.segments.tolist() == result.segments.tolist()
+
+def test_parse_index():
+    """
+    Test creating index of reMarkable lines data.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        page = r_parser.parse_table(f, 0)
+    with open(FN_EXAMPLE, 'rb') as f:
+        index = r_parser.parse_index(f)
+
+    # index shall point at stroke header
+    with open(FN_EXAMPLE, 'rb') as f:
+        offset, count = index.strokes[['offset', 'count']][-1].tolist()
+        f.seek(offset)
+        *_, n = r_parser.parse_item(r_parser.FMT_STROKE, f)
+        assert count == n
+
+    assert page.layers == len(index.layers)
+    assert len(page.strokes) == index.layers['count'].sum()
+    for name in ('layer', 'number', 'pen', 'color', 'width', 'count'):
+        assert page.strokes[name].tolist() == index.strokes[name].tolist()
+
+def test_parse_strokes():
+    """
+    Test parsing selected strokes of reMarkable lines data.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        data = f.read()
+
+    page = r_parser.parse_table(data, 0)
+    index = r_parser.parse_index(data)
+
+    selected = index.strokes[1::2]
+    result = r_parser.parse_strokes(data, 2, index, selected)
+
+    assert 2 == result.number
+    assert page.layers == result.layers
+    assert len(selected) == len(result.strokes)
+
+    # compare strokes without removing the ones hidden by eraser strokes
+    expected = [
+        s for s in r_parser._page_items(page)
+        if isinstance(s, Stroke) and s.number % 2
+    ]
+    result = [s for s in r_parser._page_items(result) if isinstance(s, Stroke)]
+    assert expected == result
+
 # vim: sw=4:et:ai
@@ -0,0 +1,147 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+PDF utilities unit tests.
+"""
+
+import numpy as np
+import pypdf
+
+from remt import pdf
+from remt.parser import empty_table
+from remt.pdfwriter import PDFSurface, PDFContext
+from remt.spatial import spatial_index
+
+from unittest import mock
+
+def create_pdf(fn, *widths):
+    """
+    Create PDF file with blank pages of given widths.
+    """
+    writer = pypdf.PdfWriter()
+    for w in widths:
+        writer.add_blank_page(w, 842)
+    with open(fn, 'wb') as f:
+        writer.write(f)
+
+def test_pdf_page_count(tmpdir):
+    """
+    Test getting number of pages of PDF file from its page tree.
+    """
+    fn = str(tmpdir.join('in.pdf'))
+    create_pdf(fn, 10, 20, 30)
+    with mock.patch.object(pdf, 'pdf_open') as f:
+        assert 3 == pdf.pdf_page_count(fn)
+    assert not f.called
+
+def test_pdf_page_count_fallback(tmpdir):
+    """
+    Test getting number of pages of PDF file with Poppler library when
+    the page tree cannot be read.
+    """
+    fn = str(tmpdir.join('in.pdf'))
+    with open(fn, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+
+    with mock.patch.object(pdf, 'pdf_open') as f:
+        f.return_value.get_n_pages.return_value = 7
+        assert 7 == pdf.pdf_page_count(fn)
+    f.assert_called_once_with(fn)
+
+def test_pdf_merge(tmpdir):
+    """
+    Test merging PDF files in page order.
+    """
+    files = [str(tmpdir.join('{}.pdf'.format(i))) for i in range(3)]
+    create_pdf(files[0], 10, 20)
+    create_pdf(files[1], 30)
+    create_pdf(files[2], 40, 50)
+
+    fn_out = str(tmpdir.join('out.pdf'))
+    pdf.pdf_merge(files, fn_out)
+
+    reader = pypdf.PdfReader(fn_out)
+    widths = [p.mediabox.width for p in reader.pages]
+    assert [10, 20, 30, 40, 50] == widths
+
+def test_pdf_overlay(tmpdir):
+    """
+    Test putting overlay pages on top of pages of PDF file.
+    """
+    fn_pdf = str(tmpdir.join('in.pdf'))
+    fn_overlay = str(tmpdir.join('overlay.pdf'))
+    fn_out = str(tmpdir.join('out.pdf'))
+    create_pdf(fn_pdf, 595, 595, 595)
+
+    surface = PDFSurface(fn_overlay, 1404, 1872)
+    cr = PDFContext(surface)
+    cr.add_path(np.array([[0, 0], [1404, 1872]]))
+    cr.stroke()
+    surface.finish()
+
+    pdf.pdf_overlay(fn_pdf, fn_overlay, [1], fn_out)
+
+    reader = pypdf.PdfReader(fn_out)
+    assert 3 == len(reader.pages)
+    assert reader.pages[0].get_contents() is None
+    assert reader.pages[2].get_contents() is None
+
+    # overlay scaled to fit the page
+    data = reader.pages[1].get_contents().get_data()
+    assert b'0.44978632 0.0 0.0 0.44978632 0.0 0.0 cm' in data
+    assert b'1404 1872 l' in data
+
+def test_pdf_texts():
+    """
+    Test getting text annotated by strokes stored in spatial index.
+    """
+    page = empty_table(0)
+    strokes = np.zeros(3, dtype=page.strokes.dtype)
+    strokes[['x1', 'y1', 'x2', 'y2']] = [
+        (100, 100, 150, 120), (np.nan,) * 4, (100, 100, 150, 150),
+    ]
+    index = spatial_index(page._replace(strokes=strokes))
+
+    # two lines of text, one character every 20 pixels
+    text = 'abcd\nefgh'
+    rects = [
+        mock.Mock(x1=x, y1=y, x2=x + 10, y2=y + 10)
+        for y in (100, 130) for x in range(60, 220, 20)[:5]
+    ]
+    pdf_page = mock.MagicMock()
+    pdf_page.get_size.return_value = (1404, 1872)
+    pdf_page.get_text.return_value = text
+    pdf_page.get_text_layout.return_value = (True, rects)
+
+    result = pdf.pdf_texts(pdf_page, index)
+    assert ['bcd', 'bcd\nfgh'] == result
+    assert 1 == pdf_page.get_text_layout.call_count
+    assert not pdf_page.get_text_for_area.called
+
+def test_pdf_texts_empty():
+    """
+    Test getting text annotated by strokes when there are no strokes.
+    """
+    index = spatial_index(empty_table(0))
+    pdf_page = mock.MagicMock()
+    assert [] == pdf.pdf_texts(pdf_page, index)
+    assert not pdf_page.get_text_layout.called
+
+# vim: sw=4:et:ai
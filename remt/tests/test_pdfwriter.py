@@ -0,0 +1,96 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+PDF file writer unit tests.
+"""
+
+import numpy as np
+import os.path
+import pypdf
+
+from remt import drawer
+from remt.parser import parse_table
+from remt.pdfwriter import PDFSurface, PDFContext
+
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', 'overview.rm'
+)
+
+def test_add_path(tmpdir):
+    """
+    Test adding array of points to a path.
+    """
+    surface = PDFSurface(str(tmpdir.join('a.pdf')), 100, 200)
+    cr = PDFContext(surface)
+    cr.set_line_cap(1)
+    cr.add_path(np.array([[1, 2], [3, 4], [5.5, 6]]))
+    cr.stroke()
+
+    expected = [
+        '/GS0 gs\n',
+        '1.00 2.00 m\n3.00 4.00 l\n5.50 6.00 l\n',
+        'S\n',
+    ]
+    assert expected == surface.content
+    surface.finish()
+
+def test_graphics_state_restore(tmpdir):
+    """
+    Test if graphics state parameters are set again after restoring
+    graphics state.
+    """
+    surface = PDFSurface(str(tmpdir.join('a.pdf')), 100, 200)
+    cr = PDFContext(surface)
+    points = np.array([[1, 2], [3, 4]])
+
+    cr.save()
+    cr.set_line_cap(1)
+    cr.add_path(points)
+    cr.stroke()
+    cr.restore()
+
+    cr.save()
+    cr.set_line_cap(1)
+    cr.add_path(points)
+    cr.stroke()
+    cr.restore()
+
+    assert 2 == surface.content.count('/GS0 gs\n')
+    surface.finish()
+
+def test_draw_pdf(tmpdir):
+    """
+    Test rendering pages into PDF file with PDF backend.
+    """
+    with open(FN_EXAMPLE, 'rb') as f:
+        page = parse_table(f.read(), 0)
+
+    fn = str(tmpdir.join('a.pdf'))
+    drawer.draw_pdf([page, page._replace(number=1)], None, fn, backend='pdf')
+
+    reader = pypdf.PdfReader(fn)
+    assert 2 == len(reader.pages)
+
+    pdf_page = reader.pages[1]
+    assert [0, 0, 1404, 1872] == list(pdf_page.mediabox)
+    assert '/GS0' in pdf_page['/Resources']['/ExtGState']
+    assert b' l\n' in pdf_page.get_contents().get_data()
+
+# vim: sw=4:et:ai
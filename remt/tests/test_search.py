@@ -0,0 +1,104 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Search index unit tests.
+"""
+
+import os.path
+
+from remt import search as r_search
+from remt.error import SearchError
+
+import pytest
+
+PAGES = [
+    ('i', 0, ['quick brown fox']),
+    ('1', 1, []),
+    ('2', 2, ['lazy dog', 'brown bear']),
+]
+
+@pytest.fixture
+def db(tmpdir):
+    db = r_search.search_open(os.path.join(str(tmpdir), 'remt', 's.db'))
+    r_search.store_document(db, 'u1', 'books/a', 'f1', PAGES)
+    r_search.store_document(db, 'u2', 'books/b', 'f2', [('1', 0, ['fox'])])
+    yield db
+    db.close()
+
+def test_search(db):
+    """
+    Test searching highlighted text.
+    """
+    result = r_search.search(db, 'brown')
+    assert 2 == len(result)
+    assert {'i', '2'} == {r.label for r in result}
+    assert {'books/a'} == {r.path for r in result}
+
+def test_search_path(db):
+    """
+    Test searching highlighted text by document path.
+    """
+    result = r_search.search(db, 'path:b AND fox')
+    assert [('books/b', '1', 'fox')] == result
+
+def test_search_invalid(db):
+    """
+    Test if search error is raised for invalid query.
+    """
+    with pytest.raises(SearchError):
+        r_search.search(db, 'fox AND')
+
+def test_store_document_replace(db):
+    """
+    Test if text of a document is replaced when the document is stored
+    again.
+    """
+    r_search.store_document(db, 'u1', 'books/a', 'f3', [('1', 0, ['owl'])])
+    assert [] == r_search.search(db, 'brown')
+    assert [('books/a', '1', 'owl')] == r_search.search(db, 'owl')
+
+def test_stale_documents(db):
+    """
+    Test finding documents to index and documents to remove from search
+    index.
+    """
+    documents = {'u1': ('books/a', 'f1-new'), 'u3': ('books/c', 'f3')}
+    stale, removed = r_search.stale_documents(db, documents)
+    assert ['u1', 'u3'] == stale
+    assert ['u2'] == removed
+
+def test_stale_documents_moved(db):
+    """
+    Test if path of moved document is updated in search index.
+    """
+    documents = {'u1': ('papers/a', 'f1'), 'u2': ('books/b', 'f2')}
+    stale, removed = r_search.stale_documents(db, documents)
+    assert [] == stale
+    assert [] == removed
+    assert {'papers/a'} == {r.path for r in r_search.search(db, 'brown')}
+
+def test_remove_documents(db):
+    """
+    Test removing documents from search index.
+    """
+    r_search.remove_documents(db, ['u1'])
+    assert [('books/b', '1', 'fox')] == r_search.search(db, 'fox')
+    stale, removed = r_search.stale_documents(db, {})
+    assert ['u2'] == removed
@@ -0,0 +1,84 @@
+#
+# remt - reMarkable tablet command-line tools
+#
+# Copyright (C) 2018-2019 by Artur Wroblewski <wrobell@riseup.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Spatial index of bounding boxes of strokes unit tests.
+"""
+
+import numpy as np
+import os.path
+
+from remt.parser import parse_table, empty_table
+from remt.spatial import spatial_index, intersects, contains
+
+import pytest
+
+FN_EXAMPLE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'examples', 'tools', 'overview.rm'
+)
+
+@pytest.fixture
+def page():
+    with open(FN_EXAMPLE, 'rb') as f:
+        return parse_table(f.read(), 0)
+
+def bbox(page):
+    s = page.strokes
+    return s['x1'], s['y1'], s['x2'], s['y2']
+
+def test_intersects(page):
+    """
+    Test finding strokes intersecting a rectangle.
+    """
+    index = spatial_index(page)
+    result = intersects(index, 300, 400, 700, 900)
+
+    x1, y1, x2, y2 = bbox(page)
+    expected = (x1 <= 700) & (x2 >= 300) & (y1 <= 900) & (y2 >= 400)
+    assert 0 < len(result)
+    assert np.flatnonzero(expected).tolist() == result.tolist()
+
+def test_intersects_page(page):
+    """
+    Test finding strokes intersecting rectangle larger than a page.
+    """
+    index = spatial_index(page)
+    result = intersects(index, -1e4, -1e4, 1e4, 1e4)
+    assert list(range(len(page.strokes))) == result.tolist()
+
+def test_contains(page):
+    """
+    Test finding strokes inside of a rectangle.
+    """
+    index = spatial_index(page)
+    result = contains(index, 300, 400, 700, 900)
+
+    x1, y1, x2, y2 = bbox(page)
+    expected = (x1 >= 300) & (x2 <= 700) & (y1 >= 400) & (y2 <= 900)
+    assert 0 < len(result)
+    assert np.flatnonzero(expected).tolist() == result.tolist()
+
+def test_empty_page():
+    """
+    Test spatial index of a page without strokes.
+    """
+    index = spatial_index(empty_table(0))
+    assert [] == intersects(index, 0, 0, 100, 100).tolist()
+
+# vim: sw=4:et:ai
@@ -23,6 +23,7 @@ Drawing tool unit tests.
 
 from remt import tool
 from remt.data import Stroke, Segment, Style
+from remt.util import segment_array
 
 def test_single_line():
     """
@@ -43,7 +44,7 @@ def test_single_line():
     # no more lines
     assert next(result, None) is None
     assert 20 == width
-    assert [(0, 0), (1, 1), (2, 2)] == list(points)
+    assert [[0, 0], [1, 1], [2, 2]] == points.tolist()
 
 def test_multi_line():
     """
@@ -57,10 +58,49 @@ def test_multi_line():
             Segment(0, 2, 2, 0, 0, 0, 3),
         ]
     )
-    calc = lambda st, seg: st.width ** seg.pressure
-    l1, l2 = tool.multi_line(calc, stroke)
+    calc = lambda st, seg: st.width ** seg['pressure']
+    (w1, p1), (w2, p2) = tool.multi_line(calc, stroke)
 
-    assert (10, ((0, 0), (1, 1))) == l1
-    assert (100, ((1, 1), (2, 2))) == l2
+    assert 10 == w1
+    assert [[0, 0], [1, 1]] == p1.tolist()
+    assert 100 == w2
+    assert [[1, 1], [2, 2]] == p2.tolist()
+
+def test_multi_line_same_width():
+    """
+    Test calculation of a multi line when width does not change.
+    """
+    stroke = Stroke(
+        0, 0, 0, 10,
+        [
+            Segment(0, 0, 0, 0, 0, 0, 1),
+            Segment(0, 1, 1, 0, 0, 0, 1),
+            Segment(0, 2, 2, 0, 0, 0, 2),
+            Segment(0, 3, 3, 0, 0, 0, 2),
+        ]
+    )
+    calc = lambda st, seg: st.width ** seg['pressure']
+    (w1, p1), (w2, p2) = tool.multi_line(calc, stroke)
+
+    # lines of the same width are merged
+    assert 10 == w1
+    assert [[0, 0], [1, 1], [2, 2]] == p1.tolist()
+    assert 100 == w2
+    assert [[2, 2], [3, 3]] == p2.tolist()
+
+def test_calc_width_ballpoint():
+    """
+    Test calculation of ballpoint width for each segment.
+    """
+    stroke = Stroke(
+        0, 0, 0, 2,
+        [
+            Segment(0, 0, 0, 0, 0, 0, 0.5),
+            Segment(0, 1, 1, 0, 0, 0, 1),
+        ]
+    )
+    segments = segment_array(stroke.segments)
+    result = tool.calc_width_ballpoint(stroke, segments)
+    assert [3 + 0, 3 + 1] == result.tolist()
 
 # vim: sw=4:et:ai
@@ -24,7 +24,8 @@ Unit tests for `remt` project utilities.
 
 from cytoolz.functoolz import flip
 
-from remt.util import split
+from remt.data import Stroke, Segment, SegmentView, BBox
+from remt.util import split, segment_array, stroke_bbox
 
 def test_split():
     """
@@ -49,4 +50,36 @@ def test_split():
 
     assert expected == list(result)
 
+def test_segment_array():
+    """
+    Test getting NumPy array of segments from segment tuples.
+    """
+    segments = [
+        Segment(0, 1, 2, 3, 4, 5, 6),
+        Segment(1, 7, 8, 9, 10, 11, 12),
+    ]
+    result = segment_array(segments)
+
+    assert [1, 7] == result['x'].tolist()
+    assert [2, 8] == result['y'].tolist()
+    assert [6, 12] == result['pressure'].tolist()
+
+    # no copy for segments view
+    assert segment_array(SegmentView(result)) is result
+
+def test_stroke_bbox():
+    """
+    Test calculating bounding box of a stroke.
+    """
+    segments = [
+        Segment(0, 1, 8, 0, 0, 0, 0),
+        Segment(1, 7, 2, 0, 0, 0, 0),
+    ]
+    stroke = Stroke(0, 0, 0, 1, segments)
+    assert BBox(1, 2, 7, 8) == stroke_bbox(stroke)
+
+    # no calculation if bounding box is known
+    stroke = Stroke(0, 0, 0, 1, [], BBox(1, 2, 3, 4))
+    assert BBox(1, 2, 3, 4) == stroke_bbox(stroke)
+
 # vim: sw=4:et:ai
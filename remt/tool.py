@@ -60,34 +60,58 @@ Try tilt test example from `http://www.wacomeng.com/windows/index.html` for
 tilt calculations.
 """
 
+import numpy as np
 from functools import partial
-from .util import to_point
+
+from .util import segment_array
+
+def stroke_points(segments):
+    """
+    Get array of points of stroke segments.
+
+    The array has shape `(n, 2)` for `n` segments.
+
+    :param segments: NumPy array of segments.
+    """
+    return np.column_stack((segments['x'], segments['y'])).astype(float)
 
 def single_line(calc, stroke):
     """
     Return collection containing single line.
 
+    A line is tuple of line width and array of points.
+
     :param calc: Width calculator.
     :param stroke: Stroke data.
     """
-    yield (calc(stroke), (to_point(seg) for seg in stroke.segments))
+    segments = segment_array(stroke.segments)
+    yield (calc(stroke), stroke_points(segments))
 
 def multi_line(calc, stroke):
     """
     Return collection of lines of varying width. 
 
+    A line is tuple of line width and array of points. Width of each pair
+    of consecutive points is calculated for all segments at once with
+    the width calculator.
+
     :param calc: Width calculator.
     :param stroke: Stroke to convert to lines.
     """
-    segments = stroke.segments
+    segments = segment_array(stroke.segments)
+    if len(segments) < 2:
+        return
+
+    points = stroke_points(segments)
+    widths = calc(stroke, segments[:-1])
 
     # only pressure changes, so optimize by drawing lines with the same
     # pressure as single path
-    lines = (
-        (calc(stroke, s1), (to_point(s1), to_point(s2)))
-        for s1, s2 in zip(segments[:-1], segments[1:])
-    )
-    yield from lines
+    idx = np.flatnonzero(np.diff(widths)) + 1
+    start = [0, *idx.tolist()]
+    end = [*idx.tolist(), len(widths)]
+    widths = widths.tolist()
+    yield from ((widths[i], points[i:j + 1]) for i, j in zip(start, end))
 
 def calc_width_fineliner(stroke):
     """
@@ -113,15 +137,15 @@ def calc_width_eraser(stroke):
     """
     return 1280 * stroke.width ** 2 - 4800 * stroke.width + 4510
 
-def calc_width_ballpoint(stroke, segment):
+def calc_width_ballpoint(stroke, segments):
     """
-    Calculate ballpoint width.
+    Calculate ballpoint width for each segment.
 
     :param stroke: Stroke data.
-    :param segment: Segment data.
+    :param segments: NumPy array of segments.
     """
     width = calc_width_fineliner(stroke)
-    return width + segment.pressure ** 2048
+    return width + segments['pressure'].astype(float) ** 2048
 
 line_ballpoint = partial(multi_line, calc_width_ballpoint)
 line_fineliner = partial(single_line, calc_width_fineliner)
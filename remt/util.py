@@ -21,13 +21,61 @@
 `remt` project utilities.
 """
 
+import math
+import numpy as np
 from itertools import groupby, chain
 from operator import attrgetter
 from cytoolz.itertoolz import partition
 
+from .data import BBox, SegmentView, DTYPE_SEGMENT
+
 flatten = chain.from_iterable
 to_point = attrgetter('x', 'y')
 
+def segment_array(segments):
+    """
+    Get NumPy structured array of segments of a stroke.
+
+    No data is copied for segments view or NumPy array.
+
+    :param segments: Segments view, NumPy array or sequence of segment
+        tuples.
+    """
+    if isinstance(segments, SegmentView):
+        return segments.array
+    elif isinstance(segments, np.ndarray):
+        return segments
+    else:
+        items = [s[1:] for s in segments]
+        return np.array(items, dtype=DTYPE_SEGMENT)
+
+def segments_bbox(segments):
+    """
+    Calculate bounding box of segments of a stroke.
+
+    :param segments: NumPy array of segments.
+    """
+    if not len(segments):
+        return (math.nan,) * 4
+
+    x = segments['x']
+    y = segments['y']
+    return float(x.min()), float(y.min()), float(x.max()), float(y.max())
+
+def stroke_bbox(stroke):
+    """
+    Get bounding box of a stroke.
+
+    Bounding box is calculated from segments of the stroke, unless the
+    stroke has it already.
+
+    :param stroke: Stroke data.
+    """
+    if stroke.bbox is not None:
+        return stroke.bbox
+
+    return BBox(*segments_bbox(segment_array(stroke.segments)))
+
 def split(key, seq):
     """
     Split sequence by a function key./
@@ -98,8 +98,8 @@ so any usage is on your own risk.
     keywords='remarkable tools',
     license='GPLv3+',
     install_requires=[
-        'pygobject', 'pycairo', 'asyncssh', 'cytoolz',
-        'asyncio-contextmanager',
+        'pygobject', 'pycairo', 'asyncssh', 'cytoolz', 'numpy',
+        'asyncio-contextmanager', 'pypdf>=3.9.0',
     ],
 )
 